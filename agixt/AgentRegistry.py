@@ -0,0 +1,156 @@
+import os
+import json
+import time
+import logging
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Seconds a cached agent is trusted before its config is checked for outside changes
+# (other uvicorn workers, manual edits to config.json, direct database writes).
+AGENT_CACHE_TTL = float(os.getenv("AGENT_CACHE_TTL", "5"))
+
+
+def get_agent_class():
+    # Imported lazily, the agent backends import this module to invalidate entries.
+    if os.getenv("DB_CONNECTED", "false").lower() == "true":
+        from db.Agent import Agent
+    else:
+        from fb.Agent import Agent
+    return Agent
+
+
+def get_config_fingerprint(agent):
+    if hasattr(agent, "config_path"):
+        try:
+            return os.path.getmtime(agent.config_path)
+        except OSError:
+            return None
+    try:
+        return json.dumps(agent.get_agent_config(), sort_keys=True, default=str)
+    except Exception:
+        return None
+
+
+def close_agent(agent):
+    extensions = getattr(agent, "extensions", None)
+    if extensions is not None:
+        extensions.close_extension_instances()
+
+
+class AgentRegistry:
+    def __init__(self, ttl: float = AGENT_CACHE_TTL):
+        self.ttl = ttl
+        self.entries = {}
+        self.versions = {}
+        self.build_locks = {}
+        self.lock = threading.RLock()
+        self.metrics = {
+            "hits": 0,
+            "misses": 0,
+            "invalidations": 0,
+            "build_seconds": 0.0,
+            "hit_seconds": 0.0,
+        }
+
+    def is_fresh(self, entry):
+        if time.monotonic() - entry["checked"] < self.ttl:
+            return True
+        if get_config_fingerprint(entry["agent"]) != entry["fingerprint"]:
+            return False
+        entry["checked"] = time.monotonic()
+        return True
+
+    def get_cached(self, agent_name: str, start: float):
+        with self.lock:
+            version = self.versions.get(agent_name, 0)
+            entry = self.entries.get(agent_name)
+        if entry and entry["version"] == version and self.is_fresh(entry):
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.metrics["hits"] += 1
+                self.metrics["hit_seconds"] += elapsed
+            logging.info(
+                f"Agent {agent_name} (v{version}) served from cache in {elapsed * 1000:.2f}ms."
+            )
+            return entry["agent"]
+        return None
+
+    def get_agent(self, agent_name: str):
+        start = time.perf_counter()
+        agent = self.get_cached(agent_name=agent_name, start=start)
+        if agent is not None:
+            return agent
+        # Agents are built outside the registry lock, so a slow build only holds up
+        # requests for that same agent, which then reuse the agent it built.
+        with self.lock:
+            build_lock = self.build_locks.setdefault(agent_name, threading.Lock())
+        with build_lock:
+            agent = self.get_cached(agent_name=agent_name, start=start)
+            if agent is not None:
+                return agent
+            with self.lock:
+                version = self.versions.get(agent_name, 0)
+            agent = get_agent_class()(agent_name=agent_name)
+            entry = {
+                "agent": agent,
+                "version": version,
+                "fingerprint": get_config_fingerprint(agent),
+                "checked": time.monotonic(),
+            }
+            old_entry = None
+            with self.lock:
+                # An agent invalidated while it was being built is returned but not cached.
+                if self.versions.get(agent_name, 0) == version:
+                    old_entry = self.entries.get(agent_name)
+                    self.entries[agent_name] = entry
+                elapsed = time.perf_counter() - start
+                self.metrics["misses"] += 1
+                self.metrics["build_seconds"] += elapsed
+        if old_entry:
+            close_agent(old_entry["agent"])
+        logging.info(
+            f"Agent {agent_name} (v{version}) constructed in {elapsed * 1000:.2f}ms."
+        )
+        return agent
+
+    def invalidate(self, agent_name: str):
+        with self.lock:
+            self.versions[agent_name] = self.versions.get(agent_name, 0) + 1
+            entry = self.entries.pop(agent_name, None)
+            self.metrics["invalidations"] += 1
+        if entry:
+            close_agent(entry["agent"])
+
+    def get_metrics(self):
+        with self.lock:
+            hits = self.metrics["hits"]
+            misses = self.metrics["misses"]
+            return {
+                "cached_agents": len(self.entries),
+                "hits": hits,
+                "misses": misses,
+                "invalidations": self.metrics["invalidations"],
+                "avg_build_ms": self.metrics["build_seconds"] * 1000 / misses
+                if misses
+                else 0.0,
+                "avg_hit_ms": self.metrics["hit_seconds"] * 1000 / hits
+                if hits
+                else 0.0,
+            }
+
+
+agent_registry = AgentRegistry()
+
+
+def get_agent(agent_name: str):
+    return agent_registry.get_agent(agent_name=agent_name)
+
+
+def invalidate_agent(agent_name: str):
+    agent_registry.invalidate(agent_name=agent_name)
+
+
+def get_agent_registry_metrics():
+    return agent_registry.get_metrics()
@@ -0,0 +1,58 @@
+import os
+import asyncio
+import importlib.util
+import weakref
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "600"))
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+# One pooled client per event loop, httpx clients can't be shared across loops.
+http_clients = weakref.WeakKeyDictionary()
+
+
+def get_http_client() -> httpx.AsyncClient:
+    loop = asyncio.get_running_loop()
+    client = http_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            timeout=httpx.Timeout(HTTP_TIMEOUT, connect=10.0),
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            ),
+        )
+        http_clients[loop] = client
+    return client
+
+
+async def close_http_clients():
+    for loop, client in list(http_clients.items()):
+        if loop is asyncio.get_running_loop():
+            await client.aclose()
+            http_clients.pop(loop, None)
+
+
+class AsyncProvider:
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await get_http_client().post(url, **kwargs)
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await get_http_client().get(url, **kwargs)
+
+    def stream(self, method: str, url: str, **kwargs):
+        return get_http_client().stream(method, url, **kwargs)
+
+    async def instruct_stream(self, prompt, tokens: int = 0):
+        # Providers without native streaming send the whole response as one chunk.
+        yield await self.instruct(prompt=prompt, tokens=tokens)
+
+    async def sleep(self, seconds: float):
+        if float(seconds) > 0:
+            await asyncio.sleep(float(seconds))
@@ -0,0 +1,179 @@
+import os
+import time
+import asyncio
+import logging
+import weakref
+from contextlib import asynccontextmanager
+from playwright.async_api import async_playwright
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "2"))
+BROWSER_MAX_PAGES = int(os.getenv("BROWSER_MAX_PAGES", "8"))
+BROWSER_PAGE_TIMEOUT = float(os.getenv("BROWSER_PAGE_TIMEOUT", "30"))
+BROWSER_BLOCK_RESOURCES = os.getenv("BROWSER_BLOCK_RESOURCES", "true").lower() == "true"
+BLOCKED_RESOURCE_TYPES = {"image", "font", "media"}
+
+# Playwright objects belong to the event loop that started them, so each loop gets its own pool.
+browser_pools = weakref.WeakKeyDictionary()
+metrics = {
+    "pages": 0,
+    "failed_pages": 0,
+    "active_pages": 0,
+    "waiting": 0,
+    "saturated": 0,
+    "wait_seconds": 0.0,
+    "page_seconds": 0.0,
+    "browser_launches": 0,
+    "started": None,
+}
+
+
+async def block_resources(route):
+    if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+class BrowserPool:
+    def __init__(
+        self,
+        size: int = BROWSER_POOL_SIZE,
+        max_pages: int = BROWSER_MAX_PAGES,
+        timeout: float = BROWSER_PAGE_TIMEOUT,
+        block: bool = BROWSER_BLOCK_RESOURCES,
+    ):
+        self.size = max(1, size)
+        self.max_pages = max(1, max_pages)
+        self.timeout = timeout
+        self.block = block
+        self.playwright = None
+        self.browsers = []
+        self.next_browser = 0
+        self.slots = asyncio.Semaphore(self.max_pages)
+        self.lock = asyncio.Lock()
+
+    async def get_browser(self):
+        async with self.lock:
+            if self.playwright is None:
+                self.playwright = await async_playwright().start()
+            self.browsers = [
+                browser for browser in self.browsers if browser.is_connected()
+            ]
+            if len(self.browsers) < self.size:
+                browser = await self.playwright.chromium.launch()
+                self.browsers.append(browser)
+                metrics["browser_launches"] += 1
+                return browser
+            browser = self.browsers[self.next_browser % len(self.browsers)]
+            self.next_browser += 1
+            return browser
+
+    @asynccontextmanager
+    async def page(self, timeout: float = None, block: bool = None, proxy: str = None):
+        # Only browsers are pooled, every page gets a fresh context that is closed with it
+        # so cookies and storage never carry over from one request to the next.
+        start = time.perf_counter()
+        if self.slots.locked():
+            metrics["saturated"] += 1
+        metrics["waiting"] += 1
+        try:
+            await self.slots.acquire()
+        finally:
+            metrics["waiting"] -= 1
+        metrics["wait_seconds"] += time.perf_counter() - start
+        if metrics["started"] is None:
+            metrics["started"] = time.monotonic()
+        metrics["active_pages"] += 1
+        context = None
+        page = None
+        opened = time.perf_counter()
+        failed = True
+        try:
+            browser = await self.get_browser()
+            if proxy:
+                context = await browser.new_context(proxy={"server": proxy})
+            else:
+                context = await browser.new_context()
+            page = await context.new_page()
+            timeout = self.timeout if timeout is None else timeout
+            block = self.block if block is None else block
+            page.set_default_timeout(float(timeout) * 1000)
+            if block:
+                await page.route("**/*", block_resources)
+            yield page
+            failed = False
+        finally:
+            metrics["active_pages"] -= 1
+            metrics["pages"] += 1
+            metrics["page_seconds"] += time.perf_counter() - opened
+            if failed:
+                metrics["failed_pages"] += 1
+            try:
+                if page is not None:
+                    await page.close()
+                if context is not None:
+                    await context.close()
+            except Exception as e:
+                logging.info(f"Error closing browser page: {e}")
+            self.slots.release()
+
+    async def close(self):
+        for browser in self.browsers:
+            try:
+                await browser.close()
+            except Exception as e:
+                logging.info(f"Error closing browser: {e}")
+        self.browsers = []
+        if self.playwright is not None:
+            await self.playwright.stop()
+            self.playwright = None
+
+
+def get_browser_pool() -> BrowserPool:
+    loop = asyncio.get_running_loop()
+    pool = browser_pools.get(loop)
+    if pool is None:
+        pool = BrowserPool()
+        browser_pools[loop] = pool
+    return pool
+
+
+async def close_browser_pools():
+    loop = asyncio.get_running_loop()
+    pool = browser_pools.pop(loop, None)
+    if pool is not None:
+        await pool.close()
+
+
+async def get_page_content(url: str, timeout: float = None, proxy: str = None):
+    # Returns the page HTML and its (link text, href) pairs, read in one round trip.
+    async with get_browser_pool().page(timeout=timeout, proxy=proxy) as page:
+        await page.goto(url)
+        content = await page.content()
+        links = await page.eval_on_selector_all(
+            "a", "links => links.map(link => [link.textContent || '', link.href])"
+        )
+    return content, [(title, href) for title, href in links]
+
+
+def get_browser_pool_metrics():
+    pages = metrics["pages"]
+    elapsed = time.monotonic() - metrics["started"] if metrics["started"] else 0
+    return {
+        "browsers": sum(len(pool.browsers) for pool in list(browser_pools.values())),
+        "max_browsers": BROWSER_POOL_SIZE,
+        "pages": pages,
+        "failed_pages": metrics["failed_pages"],
+        "active_pages": metrics["active_pages"],
+        "max_pages": BROWSER_MAX_PAGES,
+        "waiting": metrics["waiting"],
+        "saturation": metrics["active_pages"] / max(1, BROWSER_MAX_PAGES),
+        "saturated_requests": metrics["saturated"],
+        "browser_launches": metrics["browser_launches"],
+        "pages_per_second": pages / elapsed if elapsed else 0.0,
+        "avg_wait_ms": metrics["wait_seconds"] * 1000 / pages if pages else 0.0,
+        "avg_page_ms": metrics["page_seconds"] * 1000 / pages if pages else 0.0,
+    }
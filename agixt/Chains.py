@@ -2,6 +2,7 @@ import os
 import logging
 from agixtsdk import AGiXTSDK
 from Extensions import Extensions
+from AgentRegistry import get_agent
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -55,7 +56,7 @@ class Chains:
                 if "conversation_name" not in args:
                     args["conversation_name"] = f"Chain Execution History: {chain_name}"
                 if prompt_type == "Command":
-                    return await Extensions().execute_command(
+                    return await get_agent(agent_name=agent_name).execute(
                         command_name=step["prompt"]["command_name"], command_args=args
                     )
                 elif prompt_type == "Prompt":
@@ -0,0 +1,175 @@
+import os
+import time
+import asyncio
+import inspect
+import logging
+from urllib.parse import urlsplit, urlunsplit
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CRAWL_CONCURRENCY = int(os.getenv("CRAWL_CONCURRENCY", "8"))
+CRAWL_PER_HOST_CONCURRENCY = int(os.getenv("CRAWL_PER_HOST_CONCURRENCY", "2"))
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_url(url: str):
+    # Lower cases the scheme and host, drops default ports and fragments so the
+    # same page reached through different spellings is only visited once.
+    try:
+        parts = urlsplit(str(url).strip())
+        scheme = parts.scheme.lower()
+        if scheme not in DEFAULT_PORTS or not parts.hostname:
+            return None
+        host = parts.hostname.lower()
+        if parts.port and parts.port != DEFAULT_PORTS[scheme]:
+            host = f"{host}:{parts.port}"
+    except ValueError:
+        return None
+    return urlunsplit((scheme, host, parts.path or "/", parts.query, ""))
+
+
+def get_deadline(time_budget: float = 0):
+    # A request's browsing shares one deadline, 0 or less means no time limit.
+    try:
+        time_budget = float(time_budget)
+    except (TypeError, ValueError):
+        return None
+    return time.monotonic() + time_budget if time_budget > 0 else None
+
+
+def get_time_left(deadline: float = None):
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
+
+
+class VisitedIndex:
+    def __init__(self, urls=None):
+        self.urls = []
+        self.seen = set()
+        for url in urls or []:
+            self.add(url)
+
+    def add(self, url: str) -> bool:
+        # Returns False when the url (or an equivalent spelling of it) was already visited.
+        key = normalize_url(url) or url
+        if key in self.seen:
+            return False
+        self.seen.add(key)
+        self.urls.append(url)
+        return True
+
+    def __contains__(self, url):
+        return (normalize_url(url) or url) in self.seen
+
+    def __iter__(self):
+        return iter(self.urls)
+
+    def __len__(self):
+        return len(self.urls)
+
+
+class Crawler:
+    def __init__(
+        self,
+        fetch,
+        expand=None,
+        max_depth: int = 0,
+        deadline: float = None,
+        visited: VisitedIndex = None,
+        concurrency: int = CRAWL_CONCURRENCY,
+        per_host_concurrency: int = CRAWL_PER_HOST_CONCURRENCY,
+    ):
+        # fetch(url) returns (text, links). expand(url, text, links, depth) returns the
+        # urls to follow from a page, pages deeper than max_depth are not expanded.
+        # Crawling stops at deadline, a time.monotonic() value from get_deadline.
+        self.fetch = fetch
+        self.expand = expand
+        self.max_depth = max_depth
+        self.deadline = deadline
+        self.visited = visited if visited is not None else VisitedIndex()
+        self.concurrency = max(1, concurrency)
+        self.per_host_concurrency = max(1, per_host_concurrency)
+        self.hosts = {}
+        self.frontier = None
+        self.results = {}
+
+    def enqueue(self, url: str, depth: int):
+        if normalize_url(url) is None or not self.visited.add(url):
+            return
+        self.frontier.put_nowait((url, depth))
+
+    async def visit(self, url: str, depth: int):
+        host = urlsplit(url).netloc.lower()
+        if host not in self.hosts:
+            self.hosts[host] = asyncio.Semaphore(self.per_host_concurrency)
+        async with self.hosts[host]:
+            logging.info(f"Browsing link: {url}")
+            text, links = await self.fetch(url)
+        self.results[url] = (text, links)
+        if self.expand is None or depth >= self.max_depth or not links:
+            return
+        next_urls = self.expand(url, text, links, depth)
+        if inspect.isawaitable(next_urls):
+            next_urls = await next_urls
+        for next_url in next_urls or []:
+            self.enqueue(next_url, depth + 1)
+
+    async def worker(self):
+        while True:
+            url, depth = await self.frontier.get()
+            try:
+                await self.visit(url, depth)
+            except Exception as e:
+                logging.info(f"Issues reading {url}: {e}. Moving on...")
+                self.results[url] = (None, None)
+            finally:
+                self.frontier.task_done()
+
+    async def crawl(self, urls):
+        self.frontier = asyncio.Queue()
+        for url in urls:
+            self.enqueue(url, 0)
+        if self.frontier.empty():
+            return self.results
+        time_left = get_time_left(self.deadline)
+        if time_left == 0:
+            logging.info(f"Browsing time is up, skipped {self.frontier.qsize()} links.")
+            return self.results
+        start = time.monotonic()
+        workers = [asyncio.create_task(self.worker()) for _ in range(self.concurrency)]
+        try:
+            await asyncio.wait_for(self.frontier.join(), time_left)
+        except asyncio.TimeoutError:
+            logging.info(
+                f"Browsing stopped after {time_left:.2f} seconds with {self.frontier.qsize()} links left."
+            )
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        logging.info(
+            f"Browsed {len(self.results)} links in {time.monotonic() - start:.2f}s."
+        )
+        return self.results
+
+
+async def crawl_links(
+    urls, fetch, search_depth: int = 0, visited=None, deadline: float = None
+):
+    # Browses every url, then up to search_depth + 1 new links found on each of them.
+    def expand(url, text, links, depth):
+        return [link[1] for link in links if link[1] not in visited][
+            : int(search_depth) + 1
+        ]
+
+    visited = visited if visited is not None else VisitedIndex()
+    crawler = Crawler(
+        fetch=fetch,
+        expand=expand if int(search_depth) > 0 else None,
+        max_depth=1,
+        deadline=deadline,
+        visited=visited,
+    )
+    return await crawler.crawl(urls)
@@ -1,7 +1,11 @@
 import os
 import uuid
+import threading
+import contextvars
+from contextlib import contextmanager
 from sqlalchemy import (
     create_engine,
+    event,
     Column,
     Text,
     String,
@@ -9,8 +13,14 @@ from sqlalchemy import (
     ForeignKey,
     DateTime,
     Boolean,
+    Index,
+)
+from sqlalchemy.orm import (
+    sessionmaker,
+    scoped_session,
+    relationship,
+    declarative_base,
 )
-from sqlalchemy.orm import sessionmaker, relationship, declarative_base
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.sql import text
 from dotenv import load_dotenv
@@ -24,21 +34,113 @@ server = os.getenv("POSTGRES_SERVER", "localhost")
 port = os.getenv("POSTGRES_PORT", "5432")
 database_name = os.getenv("POSTGRES_DB", "postgres")
 db_connected = True if os.getenv("DB_CONNECTED", "false").lower() == "true" else False
+pool_size = int(os.getenv("POSTGRES_POOL_SIZE", "5"))
+max_overflow = int(os.getenv("POSTGRES_MAX_OVERFLOW", "10"))
+pool_pre_ping = os.getenv("POSTGRES_POOL_PRE_PING", "true").lower() == "true"
+pool_recycle = int(os.getenv("POSTGRES_POOL_RECYCLE", "1800"))
+statement_timeout = int(os.getenv("POSTGRES_STATEMENT_TIMEOUT", "0"))
 Base = declarative_base()
+
+
+class SessionScope:
+    # Sessions are not thread safe, so every thread working for a scope (the event loop
+    # and any to_thread or threadpool calls, which copy the scope with the context) gets
+    # its own session. All of them are closed together when the scope ends.
+    def __init__(self):
+        self.id = uuid.uuid4()
+        self.keys = set()
+        self.lock = threading.Lock()
+
+    def get_key(self):
+        key = (self.id, threading.get_ident())
+        with self.lock:
+            self.keys.add(key)
+        return key
+
+    def close(self):
+        with self.lock:
+            keys = self.keys
+            self.keys = set()
+        for key in keys:
+            scoped = session.registry.registry.pop(key, None)
+            if scoped is None:
+                continue
+            try:
+                scoped.close()
+            except Exception as e:
+                print(f"Error closing database session: {e}")
+
+
+# Each HTTP request is a scope, work outside a request should run in db_session_scope()
+# so its sessions are released, otherwise it falls back to one session per thread.
+session_scope = contextvars.ContextVar("session_scope", default=None)
+
+
+def get_session_scope():
+    scope = session_scope.get()
+    return scope.get_key() if scope is not None else threading.get_ident()
+
+
+@contextmanager
+def db_session_scope():
+    scope = SessionScope()
+    token = session_scope.set(scope)
+    try:
+        yield scope
+    finally:
+        session_scope.reset(token)
+        if session is not None:
+            scope.close()
+
+
 if db_connected:
     try:
         engine = create_engine(
-            f"postgresql://{username}:{password}@{server}:{port}/{database_name}"
+            f"postgresql://{username}:{password}@{server}:{port}/{database_name}",
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_pre_ping=pool_pre_ping,
+            pool_recycle=pool_recycle,
+            connect_args={"options": f"-c statement_timeout={statement_timeout}"}
+            if statement_timeout > 0
+            else {},
         )
     except Exception as e:
         print(f"Error connecting to database: {e}")
     Session = sessionmaker(bind=engine)
-    session = Session()
-    connection = engine.connect()
+    session = scoped_session(Session, scopefunc=get_session_scope)
 else:
     session = None
 
 
+class QueryCounter:
+    # Counts the SQL statements sent to the database while active, to keep query counts from regressing.
+    def __init__(self):
+        self.count = 0
+
+    def increment(self, *args, **kwargs):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(engine, "before_cursor_execute", self.increment)
+        return self
+
+    def __exit__(self, *args):
+        event.remove(engine, "before_cursor_execute", self.increment)
+
+
+class DBSessionMiddleware:
+    # Plain ASGI middleware so the session is only released once a streamed response has finished.
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or session is None:
+            return await self.app(scope, receive, send)
+        with db_session_scope():
+            await self.app(scope, receive, send)
+
+
 class Provider(Base):
     __tablename__ = "provider"
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
@@ -84,6 +186,7 @@ class Agent(Base):
         UUID(as_uuid=True), ForeignKey("provider.id"), nullable=True, default=None
     )
     settings = relationship("AgentSetting", backref="agent")  # One-to-many relationship
+    __table_args__ = (Index("ix_agent_name", "name", unique=True),)
 
 
 class Command(Base):
@@ -108,6 +211,9 @@ class Conversation(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     agent_id = Column(UUID(as_uuid=True), ForeignKey("agent.id"), nullable=False)
     name = Column(Text, nullable=False)
+    __table_args__ = (
+        Index("ix_conversation_agent_id_name", "agent_id", "name", unique=True),
+    )
 
 
 class Message(Base):
@@ -119,6 +225,14 @@ class Message(Base):
     conversation_id = Column(
         UUID(as_uuid=True), ForeignKey("conversation.id"), nullable=False
     )
+    __table_args__ = (
+        Index(
+            "ix_message_conversation_id_timestamp_id",
+            "conversation_id",
+            "timestamp",
+            "id",
+        ),
+    )
 
 
 class Setting(Base):
@@ -245,3 +359,11 @@ class Prompt(Base):
 
 if __name__ == "__main__":
     Base.metadata.create_all(engine)
+    # create_all skips tables that already exist, so add indexes to older databases too.
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                index.create(engine, checkfirst=True)
+            except Exception as e:
+                # Unique indexes can't be built while duplicate names exist.
+                print(f"Unable to create index {index.name}: {e}")
@@ -1,6 +1,136 @@
 import os
+import sqlite3
+import threading
 import numpy as np
+from hashlib import sha256
+from collections import OrderedDict
 from chromadb.utils import embedding_functions
+from dotenv import load_dotenv
+
+load_dotenv()
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "")
+
+# Settings that change which embedding function gets built, used to key the pool.
+EMBEDDER_PARAMS = {
+    "default": [],
+    "azure": ["AZURE_API_KEY", "AZURE_DEPLOYMENT_NAME", "AZURE_OPENAI_ENDPOINT"],
+    "openai": ["OPENAI_API_KEY", "API_URI"],
+    "google_palm": ["GOOGLE_API_KEY"],
+    "google_vertex": ["GOOGLE_API_KEY", "GOOGLE_PROJECT_ID"],
+    "cohere": ["COHERE_API_KEY"],
+}
+embedding_pool = {}
+embedding_pool_lock = threading.Lock()
+default_embedder = None
+
+
+def get_default_embedder():
+    # The ONNX model and its inference session are loaded once per process.
+    global default_embedder
+    with embedding_pool_lock:
+        if default_embedder is None:
+            default_embedder = embedding_functions.ONNXMiniLM_L6_V2()
+            default_embedder.DOWNLOAD_PATH = os.getcwd()
+    return default_embedder
+
+
+class EmbeddingCache:
+    def __init__(self, max_size: int = EMBEDDING_CACHE_SIZE, path: str = ""):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.db = None
+        if path:
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB)"
+            )
+            self.db.commit()
+
+    def get(self, key: str):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            if self.db is not None:
+                row = self.db.execute(
+                    "SELECT vector FROM embeddings WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    vector = np.frombuffer(row[0], dtype=np.float32)
+                    self.remember(key, vector)
+                    self.disk_hits += 1
+                    return vector
+            self.misses += 1
+            return None
+
+    def set_many(self, vectors: dict):
+        with self.lock:
+            for key, vector in vectors.items():
+                self.remember(key, vector)
+            if self.db is not None:
+                self.db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                    [(key, vector.tobytes()) for key, vector in vectors.items()],
+                )
+                self.db.commit()
+
+    def remember(self, key: str, vector: np.ndarray):
+        self.entries[key] = vector
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def get_stats(self):
+        with self.lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
+
+
+embedding_cache = EmbeddingCache(path=EMBEDDING_CACHE_PATH)
+
+
+class CachedEmbeddingFunction:
+    # Wraps a Chroma embedding function, only texts not seen before reach the embedder.
+    def __init__(self, embedder, embedder_name: str, model: str, endpoint: str = ""):
+        self.embedder = embedder
+        self.embedder_name = embedder_name
+        self.model = model
+        self.endpoint = endpoint
+
+    def get_key(self, text: str) -> str:
+        return f"{self.embedder_name}:{self.model}:{self.endpoint}:{sha256(text.encode()).hexdigest()}"
+
+    def __call__(self, texts):
+        keys = [self.get_key(text) for text in texts]
+        vectors = [embedding_cache.get(key) for key in keys]
+        missing = {}
+        for key, text, vector in zip(keys, texts, vectors):
+            if vector is None and key not in missing:
+                missing[key] = text
+        if missing:
+            embedded = self.embedder(texts=list(missing.values()))
+            new_vectors = {
+                key: np.asarray(vector, dtype=np.float32)
+                for key, vector in zip(missing.keys(), embedded)
+            }
+            embedding_cache.set_many(new_vectors)
+            vectors = [
+                new_vectors[key] if vector is None else vector
+                for key, vector in zip(keys, vectors)
+            ]
+        return [vector.tolist() for vector in vectors]
 
 
 class Embedding:
@@ -8,8 +138,7 @@ class Embedding:
         self.agent_settings = (
             agent_settings if agent_settings is not None else {"embedder": "default"}
         )
-        self.default_embedder = embedding_functions.ONNXMiniLM_L6_V2()
-        self.default_embedder.DOWNLOAD_PATH = os.getcwd()
+        self.default_embedder = get_default_embedder()
         self.embedder_settings = self.get_embedder_settings()
         if (
             "embedder" not in self.agent_settings
@@ -19,6 +148,7 @@ class Embedding:
             self.agent_settings["embedder"] = "default"
             self.embedder = self.default_embedder
             self.chunk_size = 256
+            self.batch_size = 64
         else:
             self.embedder = self.embedder_settings[self.agent_settings["embedder"]][
                 "embed"
@@ -26,6 +156,42 @@ class Embedding:
             self.chunk_size = self.embedder_settings[self.agent_settings["embedder"]][
                 "chunk_size"
             ]
+            self.batch_size = self.embedder_settings[self.agent_settings["embedder"]][
+                "batch_size"
+            ]
+        if "EMBEDDING_BATCH_SIZE" in self.agent_settings:
+            try:
+                self.batch_size = max(
+                    int(self.agent_settings["EMBEDDING_BATCH_SIZE"]), 1
+                )
+            except:
+                pass
+        embedder_name = (
+            "default"
+            if self.embedder is self.default_embedder
+            else self.agent_settings["embedder"]
+        )
+        model = (
+            getattr(self.embedder, "_model_name", None)
+            or getattr(self.embedder, "MODEL_NAME", None)
+            or type(self.embedder).__name__
+        )
+        # The same embedder and model behind another endpoint or deployment can return
+        # other vectors. The settings are hashed since keys persist in the disk cache.
+        endpoint = ""
+        if embedder_name != "default":
+            endpoint = sha256(
+                "\n".join(
+                    str(self.agent_settings.get(param, ""))
+                    for param in EMBEDDER_PARAMS[embedder_name]
+                ).encode()
+            ).hexdigest()[:16]
+        self.embedder = CachedEmbeddingFunction(
+            embedder=self.embedder,
+            embedder_name=embedder_name,
+            model=model,
+            endpoint=endpoint,
+        )
 
     def get_embedder_settings(self):
         if "API_URI" in self.agent_settings:
@@ -38,15 +204,13 @@ class Embedding:
         embedder_settings = {
             "default": {
                 "chunk_size": 256,
+                "batch_size": 64,
                 "embed": self.default_embedder,
             },
             "azure": {
                 "chunk_size": 1000,
-                "params": [
-                    "AZURE_API_KEY",
-                    "AZURE_DEPLOYMENT_NAME",
-                    "AZURE_OPENAI_ENDPOINT",
-                ],
+                "batch_size": 16,
+                "params": EMBEDDER_PARAMS["azure"],
                 "embed": embedding_functions.OpenAIEmbeddingFunction(
                     api_key=self.agent_settings["AZURE_API_KEY"],
                     organization_id=self.agent_settings["AZURE_DEPLOYMENT_NAME"],
@@ -60,7 +224,8 @@ class Embedding:
             },
             "openai": {
                 "chunk_size": 1000,
-                "params": ["OPENAI_API_KEY", "API_URI"],
+                "batch_size": 256,
+                "params": EMBEDDER_PARAMS["openai"],
                 "embed": embedding_functions.OpenAIEmbeddingFunction(
                     api_key=self.agent_settings["OPENAI_API_KEY"],
                     model_name="text-embedding-ada-002",
@@ -71,7 +236,8 @@ class Embedding:
             },
             "google_palm": {
                 "chunk_size": 1000,
-                "params": ["GOOGLE_API_KEY"],
+                "batch_size": 32,
+                "params": EMBEDDER_PARAMS["google_palm"],
                 "embed": embedding_functions.GooglePalmEmbeddingFunction(
                     api_key=self.agent_settings["GOOGLE_API_KEY"]
                 )
@@ -80,7 +246,8 @@ class Embedding:
             },
             "google_vertex": {
                 "chunk_size": 1000,
-                "params": ["GOOGLE_API_KEY", "GOOGLE_PROJECT_ID"],
+                "batch_size": 5,
+                "params": EMBEDDER_PARAMS["google_vertex"],
                 "embed": embedding_functions.GoogleVertexEmbeddingFunction(
                     api_key=self.agent_settings["GOOGLE_API_KEY"],
                     project_id=self.agent_settings["GOOGLE_PROJECT_ID"],
@@ -91,7 +258,8 @@ class Embedding:
             },
             "cohere": {
                 "chunk_size": 500,
-                "params": ["COHERE_API_KEY"],
+                "batch_size": 96,
+                "params": EMBEDDER_PARAMS["cohere"],
                 "embed": embedding_functions.CohereEmbeddingFunction(
                     api_key=self.agent_settings["COHERE_API_KEY"]
                 )
@@ -106,6 +274,31 @@ class Embedding:
         return embedding
 
 
+def get_embedding(agent_settings=None) -> Embedding:
+    # Embedding objects are shared by every Memories instance with the same embedder settings.
+    agent_settings = agent_settings if agent_settings is not None else {}
+    embedder = agent_settings.get("embedder", "default")
+    if embedder not in EMBEDDER_PARAMS:
+        embedder = "default"
+    key = (
+        (embedder,)
+        + tuple(
+            str(agent_settings.get(param, "")) for param in EMBEDDER_PARAMS[embedder]
+        )
+        + (str(agent_settings.get("EMBEDDING_BATCH_SIZE", "")),)
+    )
+    embedding = embedding_pool.get(key)
+    if embedding is None:
+        embedding = Embedding(agent_settings=agent_settings)
+        with embedding_pool_lock:
+            embedding = embedding_pool.setdefault(key, embedding)
+    return embedding
+
+
+def get_embedding_cache_stats():
+    return embedding_cache.get_stats()
+
+
 def get_embedding_providers():
     embedder_settings = Embedding().get_embedder_settings()
     return list(embedder_settings.keys())
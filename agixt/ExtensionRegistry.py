@@ -0,0 +1,183 @@
+import os
+import glob
+import time
+import logging
+import importlib
+import threading
+from inspect import signature, Parameter
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Seconds between checks of the extensions folder for added, changed or removed files.
+# 0 scans once per worker, extensions installed later need a restart.
+EXTENSIONS_WATCH_INTERVAL = float(os.getenv("EXTENSIONS_WATCH_INTERVAL", "0"))
+
+
+def get_command_params(func):
+    params = {}
+    sig = signature(func)
+    for name, param in sig.parameters.items():
+        if name == "self":
+            continue
+        if param.default == Parameter.empty:
+            params[name] = ""
+        else:
+            params[name] = param.default
+    return params
+
+
+def get_extension_commands(command_class):
+    commands = []
+    if hasattr(command_class, "commands"):
+        for command_name, command_function in command_class.commands.items():
+            commands.append(
+                {
+                    "friendly_name": command_name,
+                    "command_name": command_function.__name__,
+                    "command_args": get_command_params(command_function),
+                }
+            )
+    return commands
+
+
+class ExtensionRegistry:
+    def __init__(
+        self,
+        directory: str = "extensions",
+        watch_interval: float = EXTENSIONS_WATCH_INTERVAL,
+    ):
+        self.directory = directory
+        self.watch_interval = watch_interval
+        self.extensions = {}
+        self.agent_commands = {}
+        self.scanned = None
+        self.lock = threading.RLock()
+
+    def load_extension(self, module_name: str, modified: float, reload: bool):
+        from Extensions import Extensions
+
+        module = importlib.import_module(f"{self.directory}.{module_name}")
+        if reload:
+            module = importlib.reload(module)
+        extension_class = getattr(module, module_name)
+        settings = get_command_params(extension_class.__init__)
+        settings.pop("kwargs", None)
+        # The command table is only known once the class is built, so it is built
+        # here once with default settings instead of for every agent.
+        return {
+            "class": extension_class,
+            "modified": modified,
+            "is_extension": issubclass(extension_class, Extensions),
+            "settings": settings,
+            "commands": get_extension_commands(extension_class()),
+        }
+
+    def scan(self):
+        with self.lock:
+            if self.scanned is not None and (
+                self.watch_interval <= 0
+                or time.monotonic() - self.scanned < self.watch_interval
+            ):
+                return self.extensions
+            found = set()
+            for command_file in sorted(glob.glob(f"{self.directory}/*.py")):
+                module_name = os.path.splitext(os.path.basename(command_file))[0]
+                if module_name == "__init__":
+                    continue
+                found.add(module_name)
+                modified = os.path.getmtime(command_file)
+                extension = self.extensions.get(module_name)
+                if extension and extension["modified"] == modified:
+                    continue
+                try:
+                    self.extensions[module_name] = self.load_extension(
+                        module_name=module_name,
+                        modified=modified,
+                        reload=extension is not None,
+                    )
+                except Exception as e:
+                    logging.error(f"Error loading extension {module_name}: {e}")
+                    self.extensions.pop(module_name, None)
+                    continue
+                self.agent_commands = {
+                    key: value
+                    for key, value in self.agent_commands.items()
+                    if key[0] != module_name
+                }
+                if extension:
+                    logging.info(f"Reloaded extension {module_name}.")
+            for module_name in list(self.extensions):
+                if module_name not in found:
+                    del self.extensions[module_name]
+            if self.scanned is None:
+                logging.info(f"Loaded {len(self.extensions)} extensions.")
+            self.scanned = time.monotonic()
+            return self.extensions
+
+    def get_extension_commands(self, module_name: str, settings: dict):
+        # Extensions can offer different commands depending on their settings (an
+        # API key being set for example), so agents with the same values for the
+        # settings an extension takes share one cached command table.
+        extension = self.extensions[module_name]
+        extension_settings = {
+            key: settings[key] for key in extension["settings"] if key in settings
+        }
+        if not extension_settings:
+            return extension["commands"]
+        key = (module_name, repr(sorted(extension_settings.items())))
+        with self.lock:
+            if key not in self.agent_commands:
+                try:
+                    self.agent_commands[key] = get_extension_commands(
+                        extension["class"](**extension_settings)
+                    )
+                except Exception as e:
+                    logging.error(f"Error loading commands for {module_name}: {e}")
+                    self.agent_commands[key] = extension["commands"]
+            return self.agent_commands[key]
+
+    def get_commands(self, settings: dict = None):
+        settings = settings if settings else {}
+        commands = []
+        for module_name, extension in self.scan().items():
+            if not extension["is_extension"]:
+                continue
+            for command in self.get_extension_commands(module_name, settings):
+                commands.append(
+                    (
+                        command["friendly_name"],
+                        extension["class"],
+                        command["command_name"],
+                        command["command_args"],
+                    )
+                )
+        return commands
+
+    def get_extension_settings(self):
+        return {
+            module_name: extension["settings"]
+            for module_name, extension in self.scan().items()
+            if extension["is_extension"] and extension["settings"] != {}
+        }
+
+    def get_extensions(self):
+        extensions = []
+        for module_name, extension in self.scan().items():
+            extension_name = module_name.replace("_", " ").title()
+            extensions.append(
+                {
+                    "extension_name": extension_name,
+                    "description": extension_name,
+                    "settings": list(extension["settings"]),
+                    "commands": extension["commands"],
+                }
+            )
+        return extensions
+
+
+extension_registry = ExtensionRegistry()
+
+
+def get_extension_registry():
+    return extension_registry
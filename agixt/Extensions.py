@@ -1,198 +1,248 @@
-import importlib
-import os
-import glob
-from inspect import signature, Parameter
-import logging
-import inspect
-
-
-class Extensions:
-    def __init__(self, agent_config=None, load_commands_flag: bool = True):
-        self.agent_config = agent_config
-        if load_commands_flag:
-            self.commands = self.load_commands()
-        else:
-            self.commands = []
-        if agent_config != None:
-            if "commands" not in self.agent_config:
-                self.agent_config["commands"] = {}
-            if self.agent_config["commands"] == None:
-                self.agent_config["commands"] = {}
-            self.available_commands = self.get_available_commands()
-
-    def get_available_commands(self):
-        if self.commands == []:
-            return []
-        available_commands = []
-        for command in self.commands:
-            friendly_name, command_module, command_name, command_args = command
-            if (
-                "commands" in self.agent_config
-                and friendly_name in self.agent_config["commands"]
-            ):
-                if (
-                    self.agent_config["commands"][friendly_name] == "true"
-                    or self.agent_config["commands"][friendly_name] == True
-                ):
-                    # Add command to list of commands to return
-                    available_commands.append(
-                        {
-                            "friendly_name": friendly_name,
-                            "name": command_name,
-                            "args": command_args,
-                            "enabled": True,
-                        }
-                    )
-        return available_commands
-
-    def get_enabled_commands(self):
-        enabled_commands = []
-        for command in self.available_commands:
-            if command["enabled"]:
-                enabled_commands.append(command)
-        return enabled_commands
-
-    def get_command_args(self, command_name: str):
-        extensions = self.get_extensions()
-        for extension in extensions:
-            for command in extension["commands"]:
-                if command["friendly_name"] == command_name:
-                    return command["command_args"]
-        return {}
-
-    def load_commands(self):
-        try:
-            settings = self.agent_config["settings"]
-        except:
-            settings = {}
-        commands = []
-        command_files = glob.glob("extensions/*.py")
-        for command_file in command_files:
-            module_name = os.path.splitext(os.path.basename(command_file))[0]
-            module = importlib.import_module(f"extensions.{module_name}")
-            if issubclass(getattr(module, module_name), Extensions):
-                command_class = getattr(module, module_name)(**settings)
-                if hasattr(command_class, "commands"):
-                    for (
-                        command_name,
-                        command_function,
-                    ) in command_class.commands.items():
-                        params = self.get_command_params(command_function)
-                        # Store the module along with the function name
-                        commands.append(
-                            (
-                                command_name,
-                                getattr(module, module_name),
-                                command_function.__name__,
-                                params,
-                            )
-                        )
-        # Return the commands list
-        logging.debug(f"loaded commands: {commands}")
-        return commands
-
-    def get_extension_settings(self):
-        settings = {}
-        command_files = glob.glob("extensions/*.py")
-        for command_file in command_files:
-            module_name = os.path.splitext(os.path.basename(command_file))[0]
-            module = importlib.import_module(f"extensions.{module_name}")
-            if issubclass(getattr(module, module_name), Extensions):
-                command_class = getattr(module, module_name)()
-                params = self.get_command_params(command_class.__init__)
-                # Remove self and kwargs from params
-                if "self" in params:
-                    del params["self"]
-                if "kwargs" in params:
-                    del params["kwargs"]
-                if params != {}:
-                    settings[module_name] = params
-        return settings
-
-    def find_command(self, command_name: str):
-        for name, module, function_name, params in self.commands:
-            if name == command_name:
-                command_function = getattr(module, function_name)
-                return command_function, module, params  # Updated return statement
-        return None, None, None  # Updated return statement
-
-    def get_commands_list(self):
-        self.commands = self.load_commands()
-        commands_list = [command_name for command_name, _, _ in self.commands]
-        return commands_list
-
-    async def execute_command(self, command_name: str, command_args: dict = None):
-        command_function, module, params = self.find_command(command_name=command_name)
-        logging.info(
-            f"Executing command: {command_name} with args: {command_args}. Command Function: {command_function}"
-        )
-        if command_function is None:
-            logging.error(f"Command {command_name} not found")
-            return False
-        for param in params:
-            if param not in command_args:
-                if param != "self" and param != "kwargs":
-                    command_args[param] = None
-        args = command_args.copy()
-        for param in command_args:
-            if param not in params:
-                del args[param]
-        try:
-            output = await getattr(module(), command_function.__name__)(**args)
-        except Exception as e:
-            output = f"Error: {str(e)}"
-        logging.info(f"Command Output: {output}")
-        return output
-
-    def get_command_params(self, func):
-        params = {}
-        sig = signature(func)
-        for name, param in sig.parameters.items():
-            if name == "self":
-                continue
-            if param.default == Parameter.empty:
-                params[name] = ""
-            else:
-                params[name] = param.default
-        return params
-
-    def get_extensions(self):
-        commands = []
-        command_files = glob.glob("extensions/*.py")
-        for command_file in command_files:
-            module_name = os.path.splitext(os.path.basename(command_file))[0]
-            module = importlib.import_module(f"extensions.{module_name}")
-            command_class = getattr(module, module_name.lower())()
-            extension_name = command_file.split("/")[-1].split(".")[0]
-            extension_name = extension_name.replace("_", " ").title()
-            constructor = inspect.signature(command_class.__init__)
-            params = constructor.parameters
-            extension_settings = [
-                name for name in params if name != "self" and name != "kwargs"
-            ]
-            extension_commands = []
-            if hasattr(command_class, "commands"):
-                try:
-                    for (
-                        command_name,
-                        command_function,
-                    ) in command_class.commands.items():
-                        params = self.get_command_params(command_function)
-                        extension_commands.append(
-                            {
-                                "friendly_name": command_name,
-                                "command_name": command_function.__name__,
-                                "command_args": params,
-                            }
-                        )
-                except Exception as e:
-                    logging.error(f"Error getting commands: {e}")
-            commands.append(
-                {
-                    "extension_name": extension_name,
-                    "description": extension_name,
-                    "settings": extension_settings,
-                    "commands": extension_commands,
-                }
-            )
-        return commands
+import inspect
+import asyncio
+import logging
+import threading
+import numpy as np
+from ExtensionRegistry import get_extension_registry, get_command_params
+from Tokens import get_tokens
+
+# Pending aclose() tasks, kept referenced so they are not garbage collected mid-close.
+closing_tasks = set()
+
+
+async def close_extension(instance, result):
+    try:
+        await result
+    except Exception as e:
+        logging.error(f"Error closing extension {type(instance).__name__}: {e}")
+
+
+def start_closing_extension(instance, result):
+    task = asyncio.get_running_loop().create_task(close_extension(instance, result))
+    closing_tasks.add(task)
+    task.add_done_callback(closing_tasks.discard)
+
+
+def is_closeable(instance):
+    return callable(getattr(instance, "aclose", None)) or callable(
+        getattr(instance, "close", None)
+    )
+
+
+class Extensions:
+    def __init__(self, agent_config=None, load_commands_flag: bool = True):
+        self.agent_config = agent_config
+        if load_commands_flag:
+            self.commands = self.load_commands()
+        else:
+            self.commands = []
+        self.command_table = {command[0]: command for command in self.commands}
+        # Extension instances holding clients (they have a close() or aclose() method)
+        # are built once for this agent and shared by all of its commands, including
+        # concurrent ones, along with the event loop they were built on.
+        self.instances = {}
+        self.instances_lock = threading.Lock()
+        # The rendered command list only changes when the enabled commands change,
+        # and that rebuilds the agent along with this object.
+        self.commands_string = None
+        self.commands_tokens = None
+        self.command_embeddings = None
+        if agent_config != None:
+            if "commands" not in self.agent_config:
+                self.agent_config["commands"] = {}
+            if self.agent_config["commands"] == None:
+                self.agent_config["commands"] = {}
+            self.available_commands = self.get_available_commands()
+            self.available_commands_table = {
+                command["friendly_name"]: command for command in self.available_commands
+            }
+
+    def get_available_commands(self):
+        if self.commands == []:
+            return []
+        available_commands = []
+        for command in self.commands:
+            friendly_name, command_module, command_name, command_args = command
+            if (
+                "commands" in self.agent_config
+                and friendly_name in self.agent_config["commands"]
+            ):
+                if (
+                    self.agent_config["commands"][friendly_name] == "true"
+                    or self.agent_config["commands"][friendly_name] == True
+                ):
+                    # Add command to list of commands to return
+                    available_commands.append(
+                        {
+                            "friendly_name": friendly_name,
+                            "name": command_name,
+                            "args": command_args,
+                            "enabled": True,
+                        }
+                    )
+        return available_commands
+
+    def render_commands_string(self, commands):
+        if len(commands) == 0:
+            return None
+        command_list = "\n".join(
+            f"`{command['friendly_name']}` - Arguments: {command['args']}"
+            for command in commands
+            if command.get("enabled", True)
+        )
+        return f"Commands Available To Complete Task:\n{command_list}\n\n"
+
+    def get_commands_string(self):
+        if self.commands_string is None:
+            self.commands_string = self.render_commands_string(self.available_commands)
+        return self.commands_string
+
+    def get_commands_tokens(self):
+        if self.commands_tokens is None:
+            commands_string = self.get_commands_string()
+            self.commands_tokens = get_tokens(commands_string) if commands_string else 0
+        return self.commands_tokens
+
+    def get_relevant_commands_string(self, user_input: str, embedder, top_k: int):
+        # Large catalogs can be cut down to the top_k commands closest to the input,
+        # listed in their usual order.
+        commands = self.available_commands
+        if top_k <= 0 or len(commands) <= top_k or not user_input:
+            return self.get_commands_string()
+        with self.instances_lock:
+            if (
+                self.command_embeddings is None
+                or self.command_embeddings[0] is not embedder
+            ):
+                vectors = np.array(
+                    embedder(
+                        texts=[
+                            f"{command['friendly_name']}: {', '.join(command['args'])}"
+                            for command in commands
+                        ]
+                    ),
+                    dtype=np.float32,
+                )
+                vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-10
+                self.command_embeddings = (embedder, vectors)
+            vectors = self.command_embeddings[1]
+        query = np.array(embedder(texts=[user_input])[0], dtype=np.float32)
+        scores = vectors @ (query / (np.linalg.norm(query) + 1e-10))
+        selected = np.sort(np.argsort(-scores)[:top_k])
+        return self.render_commands_string([commands[i] for i in selected])
+
+    def get_enabled_commands(self):
+        enabled_commands = []
+        for command in self.available_commands:
+            if command["enabled"]:
+                enabled_commands.append(command)
+        return enabled_commands
+
+    def get_command_args(self, command_name: str):
+        extensions = self.get_extensions()
+        for extension in extensions:
+            for command in extension["commands"]:
+                if command["friendly_name"] == command_name:
+                    return command["command_args"]
+        return {}
+
+    def load_commands(self):
+        try:
+            settings = self.agent_config["settings"]
+        except:
+            settings = {}
+        commands = get_extension_registry().get_commands(settings=settings)
+        logging.debug(f"loaded commands: {commands}")
+        return commands
+
+    def get_extension_settings(self):
+        return get_extension_registry().get_extension_settings()
+
+    def find_command(self, command_name: str):
+        if command_name not in self.command_table:
+            return None, None, None
+        name, module, function_name, params = self.command_table[command_name]
+        return getattr(module, function_name), module, params
+
+    def get_extension_instance(self, module):
+        with self.instances_lock:
+            if module in self.instances:
+                return self.instances[module][0]
+            try:
+                settings = self.agent_config["settings"]
+            except:
+                settings = {}
+            extension_settings = get_command_params(module.__init__)
+            instance = module(
+                **{
+                    key: settings[key]
+                    for key in extension_settings
+                    if key != "kwargs" and key in settings
+                }
+            )
+            # Extensions without clients to release keep no state worth sharing.
+            if is_closeable(instance):
+                try:
+                    loop = asyncio.get_running_loop()
+                except RuntimeError:
+                    loop = None
+                self.instances[module] = (instance, loop)
+            return instance
+
+    def close_extension_instances(self):
+        # Lets extensions holding clients (browsers, database drivers) release them
+        # through a close() or aclose() method when the agent is rebuilt or removed.
+        with self.instances_lock:
+            instances = list(self.instances.values())
+            self.instances = {}
+        for instance, loop in instances:
+            close = getattr(instance, "aclose", None) or getattr(
+                instance, "close", None
+            )
+            try:
+                result = close()
+                if not inspect.isawaitable(result):
+                    continue
+                # Clients are closed on the loop they were built on, which may belong
+                # to another thread when the agent is invalidated from a threadpool.
+                if loop is not None and loop.is_running():
+                    loop.call_soon_threadsafe(start_closing_extension, instance, result)
+                else:
+                    asyncio.run(close_extension(instance, result))
+            except Exception as e:
+                logging.error(f"Error closing extension {type(instance).__name__}: {e}")
+
+    def get_commands_list(self):
+        self.commands = self.load_commands()
+        commands_list = [command_name for command_name, _, _ in self.commands]
+        return commands_list
+
+    async def execute_command(self, command_name: str, command_args: dict = None):
+        command_function, module, params = self.find_command(command_name=command_name)
+        logging.info(
+            f"Executing command: {command_name} with args: {command_args}. Command Function: {command_function}"
+        )
+        if command_function is None:
+            logging.error(f"Command {command_name} not found")
+            return False
+        for param in params:
+            if param not in command_args:
+                if param != "self" and param != "kwargs":
+                    command_args[param] = None
+        args = command_args.copy()
+        for param in command_args:
+            if param not in params:
+                del args[param]
+        try:
+            extension = self.get_extension_instance(module)
+            output = await getattr(extension, command_function.__name__)(**args)
+        except Exception as e:
+            output = f"Error: {str(e)}"
+        logging.info(f"Command Output: {output}")
+        return output
+
+    def get_command_params(self, func):
+        return get_command_params(func)
+
+    def get_extensions(self):
+        return get_extension_registry().get_extensions()
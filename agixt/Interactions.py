@@ -1,28 +1,29 @@
 import re
 import os
+import asyncio
 import regex
 import json
-import time
 import uuid
 import logging
-import tiktoken
 from datetime import datetime
 from dotenv import load_dotenv
 from readers.website import WebsiteReader
+from AgentRegistry import get_agent
+from Tokens import get_tokens, count_cached_tokens
+from PromptTemplates import compile_template
+from Crawler import crawl_links, get_deadline
 
 load_dotenv()
 
 db_connected = True if os.getenv("DB_CONNECTED", "false").lower() == "true" else False
 if db_connected:
-    from db.Agent import Agent
     from db.Prompts import Prompts
     from db.Chain import Chain
-    from db.History import log_interaction, get_conversation
+    from db.History import log_interaction, get_recent_interactions
 else:
-    from fb.Agent import Agent
     from fb.Prompts import Prompts
     from fb.Chain import Chain
-    from fb.History import log_interaction, get_conversation
+    from fb.History import log_interaction, get_recent_interactions
 
 from concurrent.futures import Future
 from agixtsdk import AGiXTSDK
@@ -35,17 +36,11 @@ chain = Chain()
 cp = Prompts()
 
 
-def get_tokens(text: str) -> int:
-    encoding = tiktoken.get_encoding("cl100k_base")
-    num_tokens = len(encoding.encode(text))
-    return num_tokens
-
-
 class Interactions:
     def __init__(self, agent_name: str = "", collection_number: int = 0):
         if agent_name != "":
             self.agent_name = agent_name
-            self.agent = Agent(self.agent_name)
+            self.agent = get_agent(agent_name=self.agent_name)
             self.agent_commands = self.agent.get_commands_string()
             self.websearch = Websearch(
                 agent_name=self.agent_name,
@@ -70,20 +65,39 @@ class Interactions:
         self.failures = 0
 
     def custom_format(self, string, **kwargs):
+        return "".join(self.format_parts(string, **kwargs))
+
+    def format_parts(self, string, **kwargs):
+        # The template split into literal text and substituted values, so static parts
+        # keep the same strings between calls and their token counts can be cached.
         if isinstance(string, list):
             string = "".join(str(x) for x in string)
+        return compile_template(string).render_parts(**kwargs)
 
-        def replace(match):
-            key = match.group(1)
-            value = kwargs.get(key, match.group(0))
-            if isinstance(value, list):
-                return "".join(str(x) for x in value)
-            else:
-                return str(value)
+    def get_token_budget(self):
+        try:
+            max_tokens = int(self.agent.PROVIDER_SETTINGS["MAX_TOKENS"])
+        except:
+            max_tokens = 4096
+        try:
+            response_tokens = int(
+                self.agent.AGENT_CONFIG["settings"]["RESPONSE_TOKEN_RESERVE"]
+            )
+        except:
+            response_tokens = min(1024, max_tokens // 4)
+        return max(max_tokens - response_tokens, 0)
 
-        pattern = r"(?<!{){([^{}\n]+)}(?!})"
-        result = re.sub(pattern, replace, string)
-        return result
+    def get_prompt_text(self, prompt="", prompt_category="Default"):
+        prompt_name = prompt if prompt != "" else "Custom Input"
+        try:
+            return cp.get_prompt_template(
+                prompt_name=prompt_name,
+                prompt_category=self.agent.AGENT_CONFIG["settings"]["AI_MODEL"]
+                if prompt_category == "Default"
+                else prompt_category,
+            ).text
+        except:
+            return prompt_name
 
     async def format_prompt(
         self,
@@ -98,20 +112,10 @@ class Interactions:
     ):
         if "user_input" in kwargs and user_input == "":
             user_input = kwargs["user_input"]
-        prompt_name = prompt if prompt != "" else "Custom Input"
-        try:
-            prompt = cp.get_prompt(
-                prompt_name=prompt_name,
-                prompt_category=self.agent.AGENT_CONFIG["settings"]["AI_MODEL"]
-                if prompt_category == "Default"
-                else prompt_category,
-            )
-        except:
-            prompt = prompt_name
+        prompt = self.get_prompt_text(prompt=prompt, prompt_category=prompt_category)
         logging.info(f"CONTEXT RESULTS: {top_results}")
-        if top_results == 0:
-            context = ""
-        else:
+        context = []
+        if top_results != 0:
             if user_input:
                 min_relevance_score = 0.0
                 if "min_relevance_score" in kwargs:
@@ -119,32 +123,42 @@ class Interactions:
                         min_relevance_score = float(kwargs["min_relevance_score"])
                     except:
                         min_relevance_score = 0.0
-                context = await self.agent_memory.get_memories(
+                collection_numbers = [self.agent_memory.collection_number]
+                if "inject_memories_from_collection_number" in kwargs:
+                    if int(kwargs["inject_memories_from_collection_number"]) > 0:
+                        collection_numbers.append(
+                            int(kwargs["inject_memories_from_collection_number"])
+                        )
+                memories = await self.agent_memory.get_memories_from_collections(
                     user_input=user_input,
+                    collection_numbers=collection_numbers,
                     limit=top_results,
                     min_relevance_score=min_relevance_score,
                 )
-                if "inject_memories_from_collection_number" in kwargs:
-                    if int(kwargs["inject_memories_from_collection_number"]) > 0:
-                        context += await WebsiteReader(
-                            agent_name=self.agent_name,
-                            agent_config=self.agent.AGENT_CONFIG,
-                            collection_number=int(
-                                kwargs["inject_memories_from_collection_number"]
-                            ),
-                        ).get_memories(
-                            user_input=user_input,
-                            limit=top_results,
-                            min_relevance_score=min_relevance_score,
-                        )
-                if context != []:
-                    context = "\n".join(context)
-                    context = f"The user's input causes you remember these things:\n{context}\n"
-                else:
-                    context = ""
-            else:
-                context = ""
-        command_list = self.agent.get_commands_string()
+                for memory in memories:
+                    metadata = memory["additional_metadata"]
+                    if metadata not in context and metadata != "":
+                        context.append(metadata)
+        try:
+            commands_top_k = int(self.agent.AGENT_CONFIG["settings"]["COMMANDS_TOP_K"])
+        except:
+            commands_top_k = 0
+        if (
+            commands_top_k > 0
+            and user_input
+            and ("{COMMANDS}" in prompt or "{command_list}" in prompt)
+        ):
+            command_list = await asyncio.to_thread(
+                self.agent.extensions.get_relevant_commands_string,
+                user_input=user_input,
+                embedder=self.agent_memory.embed.embedder,
+                top_k=commands_top_k,
+            )
+            logging.info(
+                f"Listed the {commands_top_k} most relevant commands instead of all {len(self.agent.available_commands)} ({self.agent.extensions.get_commands_tokens()} tokens)."
+            )
+        else:
+            command_list = self.agent.get_commands_string()
         if chain_name != "":
             try:
                 for arg, value in kwargs.items():
@@ -183,37 +197,76 @@ class Interactions:
             conversation_name = kwargs["conversation_name"]
         if conversation_name == "":
             conversation_name = uuid.uuid4()
-        conversation = get_conversation(
+        try:
+            history_length = int(
+                self.agent.AGENT_CONFIG["settings"]["CONVERSATION_HISTORY_LENGTH"]
+            )
+        except:
+            history_length = 5
+        interactions = get_recent_interactions(
             agent_name=self.agent_name,
             conversation_name=conversation_name,
+            n=history_length,
         )
-        conversation_history = "\n".join(
-            [
-                f"{interaction['timestamp']} {interaction['role']}: {interaction['message']} \n "
-                for interaction in conversation["interactions"]
-            ]
-        )
-        # Get only the last 5 interactions
-        conversation_history = "\n".join(
-            conversation_history.split("\n")[-5:],
-        )
+        # One part per interaction so each is token counted once and can be trimmed alone
+        conversation_history = [
+            f"{interaction['timestamp']} {interaction['role']}: {interaction['message']} \n "
+            for interaction in interactions
+        ]
+        conversation_history = [
+            f"{line}\n" for line in conversation_history[:-1]
+        ] + conversation_history[-1:]
         if "conversation_history" in kwargs:
             del kwargs["conversation_history"]
-        formatted_prompt = self.custom_format(
-            string=prompt,
-            user_input=user_input,
-            agent_name=self.agent_name,
-            COMMANDS=self.agent_commands,
-            context=context,
-            command_list=command_list,
-            date=datetime.now().strftime("%B %d, %Y %I:%M %p"),
-            working_directory=working_directory,
-            helper_agent_name=helper_agent_name,
-            conversation_history=conversation_history,
-            **kwargs,
-        )
+        # Header and trailing blank line stay, the commands in between can be dropped.
+        command_lines = command_list.splitlines(keepends=True) if command_list else []
+        date = datetime.now().strftime("%B %d, %Y %I:%M %p")
+
+        def assemble():
+            if context:
+                context_parts = ["The user's input causes you remember these things:\n"]
+                context_parts += [f"{line}\n" for line in context]
+            else:
+                context_parts = ""
+            if len(command_lines) > 2:
+                commands = command_lines
+            else:
+                commands = command_list if command_list else ""
+            return self.format_parts(
+                string=prompt,
+                user_input=user_input,
+                agent_name=self.agent_name,
+                COMMANDS=commands,
+                context=context_parts,
+                command_list=commands,
+                date=date,
+                working_directory=working_directory,
+                helper_agent_name=helper_agent_name,
+                conversation_history=conversation_history,
+                **kwargs,
+            )
 
-        tokens = get_tokens(formatted_prompt)
+        prompt_parts = assemble()
+        tokens = count_cached_tokens(prompt_parts)
+        token_budget = self.get_token_budget()
+        if tokens > token_budget:
+            original_tokens = tokens
+            # Oldest history goes first, then the least relevant memories, then commands.
+            while tokens > token_budget:
+                if len(conversation_history) > 0:
+                    conversation_history.pop(0)
+                elif len(context) > 0:
+                    context.pop()
+                elif len(command_lines) > 2:
+                    command_lines.pop(-2)
+                else:
+                    break
+                prompt_parts = assemble()
+                tokens = count_cached_tokens(prompt_parts)
+            logging.info(
+                f"Prompt trimmed from {original_tokens} to {tokens} tokens to fit the budget of {token_budget}."
+            )
+        formatted_prompt = "".join(prompt_parts)
         logging.info(f"FORMATTED PROMPT: {formatted_prompt}")
         return formatted_prompt, prompt, tokens
 
@@ -251,31 +304,17 @@ class Interactions:
                 websearch_timeout = 0
         else:
             websearch_timeout = 0
+        websearch_deadline = get_deadline(websearch_timeout)
         if browse_links != False:
             links = re.findall(r"(?P<url>https?://[^\s]+)", user_input)
             if links is not None and len(links) > 0:
-                for link in links:
-                    if link not in self.websearch.browsed_links:
-                        logging.info(f"Browsing link: {link}")
-                        self.websearch.browsed_links.append(link)
-                        (
-                            text_content,
-                            link_list,
-                        ) = await self.agent_memory.write_website_to_memory(url=link)
-                        if int(websearch_depth) > 0:
-                            if link_list is not None and len(link_list) > 0:
-                                i = 0
-                                for sublink in link_list:
-                                    if sublink[1] not in self.websearch.browsed_links:
-                                        logging.info(f"Browsing link: {sublink[1]}")
-                                        if i <= websearch_depth:
-                                            (
-                                                text_content,
-                                                link_list,
-                                            ) = await self.agent_memory.write_website_to_memory(
-                                                url=sublink[1]
-                                            )
-                                            i = i + 1
+                await crawl_links(
+                    urls=links,
+                    fetch=self.agent_memory.write_website_to_memory,
+                    search_depth=websearch_depth,
+                    visited=self.websearch.browsed_links,
+                    deadline=websearch_deadline,
+                )
         if websearch:
             if user_input == "":
                 if "primary_objective" in kwargs and "task" in kwargs:
@@ -289,6 +328,7 @@ class Interactions:
                     user_input=search_string,
                     websearch_depth=websearch_depth,
                     websearch_timeout=websearch_timeout,
+                    deadline=websearch_deadline,
                 )
         formatted_prompt, unformatted_prompt, tokens = await self.format_prompt(
             user_input=user_input,
@@ -314,14 +354,14 @@ class Interactions:
             logging.info(f"TOKENS: {tokens}")
             self.failures += 1
             if self.failures == 5:
-                self.failures == 0
+                self.failures = 0
                 logging.info("Failed to get a response 5 times in a row.")
                 return None
-            logging.info(f"Retrying in 10 seconds...")
-            time.sleep(10)
-            if context_results > 0:
-                context_results = context_results - 1
-            self.response = ApiClient.prompt_agent(
+            # The prompt already fits the token budget, so only back off for provider errors.
+            logging.info(f"Retrying in {self.failures} seconds...")
+            await asyncio.sleep(self.failures)
+            self.response = await asyncio.to_thread(
+                ApiClient.prompt_agent,
                 agent_name=self.agent_name,
                 prompt_name=prompt,
                 prompt_args={
@@ -378,31 +418,17 @@ class Interactions:
                 return_response = f"{self.response}\n\n{execution_response}"
             self.response = return_response
         logging.info(f"Response: {self.response}")
-        if self.response != "" and self.response != None:
-            if disable_memory != True:
-                try:
-                    await self.agent_memory.write_text_to_memory(
-                        user_input=user_input,
-                        text=self.response,
-                    )
-                except:
-                    pass
-            log_interaction(
-                agent_name=self.agent_name,
-                conversation_name=conversation_name,
-                role="USER",
-                message=user_input if user_input != "" else formatted_prompt,
-            )
-            log_interaction(
-                agent_name=self.agent_name,
-                conversation_name=conversation_name,
-                role=self.agent_name,
-                message=self.response,
-            )
+        await self.store_response(
+            user_input=user_input,
+            formatted_prompt=formatted_prompt,
+            conversation_name=conversation_name,
+            disable_memory=disable_memory,
+        )
         if shots > 1:
             responses = [self.response]
             for shot in range(shots - 1):
-                shot_response = ApiClient.prompt_agent(
+                shot_response = await asyncio.to_thread(
+                    ApiClient.prompt_agent,
                     agent_name=self.agent_name,
                     prompt_name=prompt,
                     prompt_args={
@@ -415,7 +441,7 @@ class Interactions:
                         **kwargs,
                     },
                 )
-                time.sleep(1)
+                await asyncio.sleep(1)
                 responses.append(shot_response)
             return "\n".join(
                 [
@@ -425,6 +451,95 @@ class Interactions:
             )
         return self.response
 
+    async def store_response(
+        self,
+        user_input: str,
+        formatted_prompt: str,
+        conversation_name: str,
+        disable_memory: bool = False,
+    ):
+        if self.response != "" and self.response != None:
+            if disable_memory != True:
+                try:
+                    await self.agent_memory.write_text_to_memory(
+                        user_input=user_input,
+                        text=self.response,
+                    )
+                except:
+                    pass
+            log_interaction(
+                agent_name=self.agent_name,
+                conversation_name=conversation_name,
+                role="USER",
+                message=user_input if user_input != "" else formatted_prompt,
+            )
+            log_interaction(
+                agent_name=self.agent_name,
+                conversation_name=conversation_name,
+                role=self.agent_name,
+                message=self.response,
+            )
+
+    async def run_stream(
+        self,
+        user_input: str = "",
+        prompt: str = "",
+        context_results: int = 5,
+        websearch: bool = False,
+        websearch_depth: int = 3,
+        disable_memory: bool = False,
+        conversation_name: str = "",
+        browse_links: bool = False,
+        prompt_category: str = "Default",
+        **kwargs,
+    ):
+        disable_memory = True if str(disable_memory).lower() == "true" else False
+        if conversation_name == "":
+            conversation_name = uuid.uuid4()
+        unformatted_prompt = self.get_prompt_text(
+            prompt=prompt, prompt_category=prompt_category
+        )
+        if (
+            "{COMMANDS}" in unformatted_prompt
+            or websearch
+            or str(browse_links).lower() == "true"
+        ):
+            # Command execution needs the complete response before anything can be sent,
+            # web searching and link browsing are left to run() as well.
+            yield await self.run(
+                user_input=user_input,
+                prompt=prompt,
+                context_results=context_results,
+                websearch=websearch,
+                websearch_depth=websearch_depth,
+                disable_memory=disable_memory,
+                conversation_name=conversation_name,
+                browse_links=browse_links,
+                prompt_category=prompt_category,
+                **kwargs,
+            )
+            return
+        formatted_prompt, unformatted_prompt, tokens = await self.format_prompt(
+            user_input=user_input,
+            top_results=int(context_results),
+            prompt=prompt,
+            prompt_category=prompt_category,
+            conversation_name=conversation_name,
+            **kwargs,
+        )
+        chunks = []
+        async for chunk in self.agent.instruct_stream(formatted_prompt, tokens=tokens):
+            chunks.append(chunk)
+            yield chunk
+        self.response = "".join(chunks)
+        logging.info(f"Response: {self.response}")
+        await self.store_response(
+            user_input=user_input,
+            formatted_prompt=formatted_prompt,
+            conversation_name=conversation_name,
+            disable_memory=disable_memory,
+        )
+
     # Worker Sub-Agents
     async def validation_agent(
         self,
@@ -452,7 +567,8 @@ class Interactions:
                 context_results = context_results - 1
             else:
                 context_results = 0
-            execution_response = ApiClient.prompt_agent(
+            execution_response = await asyncio.to_thread(
+                ApiClient.prompt_agent,
                 agent_name=self.agent_name,
                 prompt_name="JSONFormatter",
                 prompt_args={
@@ -513,63 +629,63 @@ class Interactions:
         )
         if "commands" in validated_response:
             for command_name, command_args in validated_response["commands"].items():
-                # Search for the command in the available_commands list, and if found, use the command's name attribute for execution
-                if command_name is not None:
-                    for available_command in self.agent.available_commands:
-                        if command_name == available_command["friendly_name"]:
-                            # Check if the command is a valid command in the self.avent.available_commands list
-                            try:
-                                if bool(self.agent.AUTONOMOUS_EXECUTION) == True:
-                                    command_output = await self.agent.execute(
-                                        command_name=command_name,
-                                        command_args=command_args,
-                                    )
-                                    message = (
-                                        f"Executed Command: {command_name} with args {command_args}.\nCommand Output: {command_output}",
-                                    )
-                                else:
-                                    command_output = (
-                                        self.create_command_suggestion_chain(
-                                            agent_name=self.agent_name,
-                                            command_name=command_name,
-                                            command_args=command_args,
-                                        )
-                                    )
-                                    message = (
-                                        f"Agent execution chain for command {command_name} with args {command_args} updated.",
-                                    )
-                            except Exception as e:
-                                logging.info("Command validation failed, retrying...")
-                                validate_command = ApiClient.prompt_agent(
-                                    agent_name=self.agent_name,
-                                    prompt_name="ValidationFailed",
-                                    prompt_args={
-                                        "command_name": command_name,
-                                        "command_args": command_args,
-                                        "command_output": e,
-                                        "user_input": user_input,
-                                        "context_results": context_results,
-                                        "conversation_name": conversation_name,
-                                        "disable_memory": disable_memory,
-                                        **kwargs,
-                                    },
-                                )
-                                return await self.execution_agent(
-                                    execution_response=validate_command,
-                                    user_input=user_input,
-                                    context_results=context_results,
-                                    disable_memory=disable_memory,
-                                    conversation_name=conversation_name,
-                                    **kwargs,
-                                )
-                            log_interaction(
+                # Look the command up by its friendly name in the agent's enabled commands
+                if (
+                    command_name is not None
+                    and command_name in self.agent.extensions.available_commands_table
+                ):
+                    try:
+                        if bool(self.agent.AUTONOMOUS_EXECUTION) == True:
+                            command_output = await self.agent.execute(
+                                command_name=command_name,
+                                command_args=command_args,
+                            )
+                            message = (
+                                f"Executed Command: {command_name} with args {command_args}.\nCommand Output: {command_output}",
+                            )
+                        else:
+                            command_output = await asyncio.to_thread(
+                                self.create_command_suggestion_chain,
                                 agent_name=self.agent_name,
-                                conversation_name=conversation_name,
-                                role="PYTHON-TERMINAL",
-                                message=message,
+                                command_name=command_name,
+                                command_args=command_args,
                             )
-                            logging.info(message)
-                            return f"\n{message}\n"
+                            message = (
+                                f"Agent execution chain for command {command_name} with args {command_args} updated.",
+                            )
+                    except Exception as e:
+                        logging.info("Command validation failed, retrying...")
+                        validate_command = await asyncio.to_thread(
+                            ApiClient.prompt_agent,
+                            agent_name=self.agent_name,
+                            prompt_name="ValidationFailed",
+                            prompt_args={
+                                "command_name": command_name,
+                                "command_args": command_args,
+                                "command_output": e,
+                                "user_input": user_input,
+                                "context_results": context_results,
+                                "conversation_name": conversation_name,
+                                "disable_memory": disable_memory,
+                                **kwargs,
+                            },
+                        )
+                        return await self.execution_agent(
+                            execution_response=validate_command,
+                            user_input=user_input,
+                            context_results=context_results,
+                            disable_memory=disable_memory,
+                            conversation_name=conversation_name,
+                            **kwargs,
+                        )
+                    log_interaction(
+                        agent_name=self.agent_name,
+                        conversation_name=conversation_name,
+                        role="PYTHON-TERMINAL",
+                        message=message,
+                    )
+                    logging.info(message)
+                    return f"\n{message}\n"
                 else:
                     if command_name == "None.":
                         return "\nNo commands were executed.\n"
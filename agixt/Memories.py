@@ -1,13 +1,25 @@
 import logging
 import os
+import time
+import threading
 import asyncio
 import sys
 import chromadb
 from chromadb.config import Settings
 from chromadb.api.types import QueryResult
-from numpy import array, linalg, ndarray
-from hashlib import sha256
-from Embedding import Embedding
+from numpy import (
+    array,
+    argsort,
+    flatnonzero,
+    linalg,
+    ndarray,
+    packbits,
+    uint8,
+    uint64,
+    unpackbits,
+)
+from hashlib import sha256, blake2b
+from Embedding import get_embedding
 from datetime import datetime
 from collections import Counter
 from typing import List
@@ -24,15 +36,110 @@ ApiClient = AGiXTSDK(
 if sys.platform == "win32":
     asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
 
+chroma_clients = {}
+chroma_clients_lock = threading.Lock()
 
-def nlp(text):
-    try:
-        sp = spacy.load("en_core_web_sm")
-    except:
-        spacy.cli.download("en_core_web_sm")
-        sp = spacy.load("en_core_web_sm")
-    sp.max_length = 99999999999999999999999
-    return sp(text)
+
+def get_chroma_client(memories_dir: str):
+    # One persistent client per memories directory, shared by every Memories instance.
+    with chroma_clients_lock:
+        if memories_dir not in chroma_clients:
+            if not os.path.exists(memories_dir):
+                os.makedirs(memories_dir)
+            chroma_clients[memories_dir] = chromadb.PersistentClient(
+                path=memories_dir,
+                settings=Settings(
+                    anonymized_telemetry=False,
+                ),
+            )
+        return chroma_clients[memories_dir]
+
+
+# Largest piece of text handed to spaCy at once, longer content is streamed through nlp.pipe.
+NLP_SEGMENT_LENGTH = 100000
+nlp_pipeline = None
+nlp_lock = threading.Lock()
+
+
+def get_nlp():
+    # Loaded once per process with only what chunking needs: sentence boundaries and POS tags.
+    global nlp_pipeline
+    with nlp_lock:
+        if nlp_pipeline is None:
+            exclude = ["parser", "ner", "lemmatizer"]
+            try:
+                sp = spacy.load("en_core_web_sm", exclude=exclude)
+            except OSError:
+                spacy.cli.download("en_core_web_sm")
+                sp = spacy.load("en_core_web_sm", exclude=exclude)
+            if "senter" in sp.disabled:
+                sp.enable_pipe("senter")
+            if "senter" not in sp.pipe_names:
+                sp.add_pipe("sentencizer")
+            nlp_pipeline = sp
+    return nlp_pipeline
+
+
+def split_text(text: str, max_length: int = NLP_SEGMENT_LENGTH) -> List[str]:
+    segments = []
+    segment = ""
+    for line in text.splitlines(keepends=True):
+        while len(line) > max_length:
+            if segment:
+                segments.append(segment)
+                segment = ""
+            segments.append(line[:max_length])
+            line = line[max_length:]
+        if len(segment) + len(line) > max_length:
+            segments.append(segment)
+            segment = ""
+        segment += line
+    if segment.strip():
+        segments.append(segment)
+    return segments
+
+
+def simhash(text: str) -> int:
+    # 64-bit SimHash over 3-word shingles, near-identical texts differ in only a few bits.
+    words = text.lower().split()
+    shingles = [" ".join(words[i : i + 3]) for i in range(max(len(words) - 2, 1))]
+    hashes = array(
+        [
+            int.from_bytes(blake2b(shingle.encode(), digest_size=8).digest(), "little")
+            for shingle in shingles
+        ],
+        dtype=uint64,
+    )
+    bits = unpackbits(hashes.view(uint8).reshape(-1, 8), axis=1, bitorder="little")
+    weights = bits.sum(axis=0, dtype="int64") * 2 - len(shingles)
+    return int(packbits(weights > 0, bitorder="little").view(uint64)[0])
+
+
+class SimHashIndex:
+    # Splits hashes into distance + 1 bands, any hash within the distance shares a band.
+    def __init__(self, distance: int):
+        self.distance = distance
+        self.bands = distance + 1
+        self.band_bits = 64 // self.bands
+        self.buckets = [{} for _ in range(self.bands)]
+
+    def get_bands(self, value: int):
+        mask = (1 << self.band_bits) - 1
+        return [(value >> (band * self.band_bits)) & mask for band in range(self.bands)]
+
+    def is_near_duplicate(self, value: int) -> bool:
+        for band, key in enumerate(self.get_bands(value)):
+            for candidate in self.buckets[band].get(key, []):
+                if (candidate ^ value).bit_count() <= self.distance:
+                    return True
+        return False
+
+    def add(self, value: int):
+        for band, key in enumerate(self.get_bands(value)):
+            self.buckets[band].setdefault(key, []).append(value)
+
+
+simhash_indexes = {}
 
 
 def camel_to_snake(camel_str):
@@ -75,6 +182,11 @@ def chroma_compute_similarity_scores(
     return similarity_scores
 
 
+def distances_to_relevance_scores(distances: ndarray) -> ndarray:
+    # Only cosine distances map straight to a similarity, l2 ones depend on the vector norms.
+    return 1.0 - distances
+
+
 def query_results_to_records(results: "QueryResult"):
     try:
         if isinstance(results["ids"][0], str):
@@ -97,7 +209,9 @@ def query_results_to_records(results: "QueryResult"):
         for id, document, embedding, metadata in zip(
             results["ids"][0],
             results["documents"][0],
-            results["embeddings"][0],
+            results["embeddings"][0]
+            if results.get("embeddings")
+            else [None] * len(results["ids"][0]),
             results["metadatas"][0],
         )
     ]
@@ -123,20 +237,22 @@ class Memories:
             if "settings" in self.agent_config
             else {"embedder": "default"}
         )
-        memories_dir = os.path.join(os.getcwd(), "memories")
-        if not os.path.exists(memories_dir):
-            os.makedirs(memories_dir)
-        self.chroma_client = chromadb.PersistentClient(
-            path=memories_dir,
-            settings=Settings(
-                anonymized_telemetry=False,
-            ),
+        self.chroma_client = get_chroma_client(
+            memories_dir=os.path.join(os.getcwd(), "memories")
         )
-        self.embed = Embedding(agent_settings=self.agent_settings)
+        self.embed = get_embedding(agent_settings=self.agent_settings)
         self.chunk_size = self.embed.chunk_size
+        self.batch_size = self.embed.batch_size
         self.embedder = self.embed.embedder
+        try:
+            self.near_duplicate_distance = int(
+                self.agent_settings.get("MEMORY_NEAR_DUPLICATE_DISTANCE", 0)
+            )
+        except:
+            self.near_duplicate_distance = 0
 
     async def wipe_memory(self):
+        simhash_indexes.pop(self.collection_name, None)
         try:
             self.chroma_client.delete_collection(name=self.collection_name)
             return True
@@ -156,62 +272,130 @@ class Memories:
             if collection.startswith(collection_name)
         ]
 
-    async def get_collection(self):
+    def get_collection_name(self, collection_number: int = 0):
+        collection_name = camel_to_snake(self.agent_name)
+        if int(collection_number) > 0:
+            collection_name = f"{collection_name}_{collection_number}"
+        return collection_name
+
+    async def get_collection(self, collection_name: str = None):
+        if collection_name is None:
+            collection_name = self.collection_name
         try:
             return self.chroma_client.get_collection(
-                name=self.collection_name, embedding_function=self.embedder
+                name=collection_name, embedding_function=self.embedder
             )
         except:
             self.chroma_client.create_collection(
-                name=self.collection_name,
+                name=collection_name,
                 embedding_function=self.embedder,
+                metadata={"hnsw:space": "cosine"},
             )
             return self.chroma_client.get_collection(
-                name=self.collection_name, embedding_function=self.embedder
+                name=collection_name, embedding_function=self.embedder
             )
 
     async def delete_memory(self, key: str):
         collection = await self.get_collection()
+        simhash_indexes.pop(self.collection_name, None)
         try:
             collection.delete(ids=key)
             return True
         except:
             return False
 
+    async def get_simhash_index(self, collection):
+        index = simhash_indexes.get(self.collection_name)
+        if index is None or index.distance != self.near_duplicate_distance:
+            index = SimHashIndex(distance=self.near_duplicate_distance)
+            existing = collection.get(include=["metadatas"])
+            for metadata in existing["metadatas"]:
+                if metadata and "simhash" in metadata:
+                    index.add(int(metadata["simhash"], 16))
+            simhash_indexes[self.collection_name] = index
+        return index
+
     async def write_text_to_memory(self, user_input: str, text: str):
         collection = await self.get_collection()
         if text:
             if not isinstance(text, str):
                 text = str(text)
+            start_time = time.perf_counter()
             chunks = await self.chunk_content(content=text, chunk_size=self.chunk_size)
-            for chunk in chunks:
-                metadata = {
-                    "timestamp": datetime.now().isoformat(),
-                    "is_reference": str(False),
-                    "external_source_name": user_input,
-                    "description": user_input,
-                    "additional_metadata": chunk,
-                    "id": sha256(
-                        (chunk + datetime.now().isoformat()).encode()
-                    ).hexdigest(),
-                }
-                collection.add(
-                    ids=metadata["id"],
-                    metadatas=metadata,
-                    documents=chunk,
+            index = (
+                await self.get_simhash_index(collection=collection)
+                if self.near_duplicate_distance > 0
+                else None
+            )
+            written = 0
+            skipped = 0
+            for i in range(0, len(chunks), self.batch_size):
+                batch = chunks[i : i + self.batch_size]
+                # Content-addressed IDs, the same chunk always maps to the same record.
+                batch_chunks = {}
+                for chunk in batch:
+                    batch_chunks.setdefault(sha256(chunk.encode()).hexdigest(), chunk)
+                existing_ids = set(
+                    collection.get(ids=list(batch_chunks.keys()), include=[])["ids"]
+                )
+                metadatas = []
+                documents = []
+                for chunk_id, chunk in batch_chunks.items():
+                    if chunk_id in existing_ids:
+                        continue
+                    metadata = {
+                        "timestamp": datetime.now().isoformat(),
+                        "is_reference": str(False),
+                        "external_source_name": user_input,
+                        "description": user_input,
+                        "additional_metadata": chunk,
+                        "id": chunk_id,
+                    }
+                    if index is not None:
+                        chunk_hash = simhash(chunk)
+                        if index.is_near_duplicate(chunk_hash):
+                            continue
+                        index.add(chunk_hash)
+                        metadata["simhash"] = format(chunk_hash, "016x")
+                    metadatas.append(metadata)
+                    documents.append(chunk)
+                skipped += len(batch) - len(documents)
+                if not documents:
+                    continue
+                # Embed the whole batch in one call so Chroma does not embed chunk by chunk.
+                collection.upsert(
+                    ids=[metadata["id"] for metadata in metadatas],
+                    embeddings=self.embedder(texts=documents),
+                    metadatas=metadatas,
+                    documents=documents,
                 )
+                written += len(documents)
+            elapsed = time.perf_counter() - start_time
+            logging.info(
+                f"Wrote {written} chunks to {self.collection_name} in {elapsed:.2f}s "
+                f"({len(chunks) / elapsed if elapsed > 0 else 0:.2f} chunks/sec), "
+                f"skipped {skipped} duplicate chunks."
+            )
 
     async def get_memories_data(
         self,
         user_input: str,
         limit: int,
         min_relevance_score: float = 0.0,
+        include_embeddings: bool = False,
     ) -> List[dict]:
         if not user_input:
             return ""
         collection = await self.get_collection()
         if collection == None:
             return ""
+        if not include_embeddings:
+            return self.query_collection(
+                collection=collection,
+                embedding=self.embed.embed_text(text=user_input),
+                limit=limit,
+                min_relevance_score=min_relevance_score,
+            )
         embedding = array(self.embed.embed_text(text=user_input))
         results = collection.query(
             query_embeddings=embedding.tolist(),
@@ -243,6 +427,107 @@ class Memories:
         top_results = filtered_results[:limit]
         return top_results
 
+    def query_collection(
+        self,
+        collection,
+        embedding,
+        limit: int,
+        min_relevance_score: float = 0.0,
+    ) -> List[dict]:
+        # Cosine collections are scored from the distances Chroma already computed.
+        # Older l2 collections may hold vectors that are not normalized, so their
+        # matches are sent back with their vectors and scored with an exact cosine.
+        space = (collection.metadata or {}).get("hnsw:space", "l2")
+        include = ["metadatas", "documents", "distances"]
+        if space != "cosine":
+            include.append("embeddings")
+        results = collection.query(
+            query_embeddings=[list(embedding)],
+            n_results=limit,
+            include=include,
+        )
+        if not results["ids"] or len(results["ids"][0]) == 0:
+            logging.warning("Embedding collection is empty.")
+            return []
+        if space == "cosine":
+            scores = distances_to_relevance_scores(
+                distances=array(results["distances"][0], dtype=float)
+            )
+        else:
+            scores = chroma_compute_similarity_scores(
+                embedding=array(embedding, dtype=float),
+                embedding_array=array(results["embeddings"][0], dtype=float),
+            )
+        kept = flatnonzero(scores >= min_relevance_score)
+        kept = kept[argsort(-scores[kept], kind="stable")][:limit]
+        records = []
+        for i in kept:
+            metadata = results["metadatas"][0][i]
+            records.append(
+                {
+                    "is_reference": metadata["is_reference"] == "True",
+                    "external_source_name": metadata["external_source_name"],
+                    "id": metadata["id"],
+                    "description": metadata["description"],
+                    "text": results["documents"][0][i],
+                    "additional_metadata": metadata["additional_metadata"],
+                    "key": results["ids"][0][i],
+                    "timestamp": metadata["timestamp"],
+                    "relevance_score": float(scores[i]),
+                }
+            )
+        return records
+
+    async def get_memories_from_collections(
+        self,
+        user_input: str,
+        collection_numbers: List[int],
+        limit: int,
+        min_relevance_score: float = 0.0,
+    ) -> List[dict]:
+        if not user_input:
+            return []
+        collection_names = []
+        for collection_number in collection_numbers:
+            collection_name = self.get_collection_name(collection_number)
+            if collection_name not in collection_names:
+                collection_names.append(collection_name)
+        collections = [
+            await self.get_collection(collection_name=collection_name)
+            for collection_name in collection_names
+        ]
+        embedding = self.embed.embed_text(text=user_input)
+        results = await asyncio.gather(
+            *[
+                asyncio.to_thread(
+                    self.query_collection,
+                    collection=collection,
+                    embedding=embedding,
+                    limit=limit,
+                    min_relevance_score=min_relevance_score,
+                )
+                for collection in collections
+            ],
+            return_exceptions=True,
+        )
+        records = []
+        for collection_name, result in zip(collection_names, results):
+            if isinstance(result, Exception):
+                logging.warning(
+                    f"Unable to query memories from {collection_name}: {result}"
+                )
+                continue
+            records.extend(result)
+        records.sort(key=lambda record: record["relevance_score"], reverse=True)
+        merged = []
+        seen = set()
+        for record in records:
+            if record["text"] in seen:
+                continue
+            seen.add(record["text"])
+            merged.append(record)
+        return merged
+
     async def get_memories(
         self,
         user_input: str,
@@ -266,38 +551,42 @@ class Memories:
                     response.append(metadata)
         return response
 
-    def score_chunk(self, chunk: str, keywords: set) -> int:
+    def score_chunk(self, chunk: str, keywords: Counter) -> int:
         """Score a chunk based on the number of query keywords it contains."""
         chunk_counter = Counter(chunk.split())
-        score = sum(chunk_counter[keyword] for keyword in keywords)
+        score = sum(
+            count * keywords[word]
+            for word, count in chunk_counter.items()
+            if word in keywords
+        )
         return score
 
     async def chunk_content(self, content: str, chunk_size: int) -> List[str]:
-        doc = nlp(content)
-        sentences = list(doc.sents)
-        content_chunks = []
+        chunk_texts = []
         chunk = []
         chunk_len = 0
-        keywords = [
-            token.text for token in doc if token.pos_ in {"NOUN", "PROPN", "VERB"}
-        ]
-        for sentence in sentences:
-            sentence_tokens = len(sentence)
-            if chunk_len + sentence_tokens > chunk_size and chunk:
-                chunk_text = " ".join(token.text for token in chunk)
-                content_chunks.append(
-                    (self.score_chunk(chunk_text, keywords), chunk_text)
-                )
-                chunk = []
-                chunk_len = 0
+        keywords = Counter()
+        for doc in get_nlp().pipe(split_text(content), batch_size=8):
+            keywords.update(
+                token.text for token in doc if token.pos_ in {"NOUN", "PROPN", "VERB"}
+            )
+            for sentence in doc.sents:
+                sentence_tokens = len(sentence)
+                if chunk_len + sentence_tokens > chunk_size and chunk:
+                    chunk_texts.append(" ".join(chunk))
+                    chunk = []
+                    chunk_len = 0
 
-            chunk.extend(sentence)
-            chunk_len += sentence_tokens
+                chunk.extend(token.text for token in sentence)
+                chunk_len += sentence_tokens
 
         if chunk:
-            chunk_text = " ".join(token.text for token in chunk)
-            content_chunks.append((self.score_chunk(chunk_text, keywords), chunk_text))
+            chunk_texts.append(" ".join(chunk))
 
+        content_chunks = [
+            (self.score_chunk(chunk_text, keywords), chunk_text)
+            for chunk_text in chunk_texts
+        ]
         # Sort the chunks by their score in descending order before returning them
         content_chunks.sort(key=lambda x: x[0], reverse=True)
         return [chunk_text for score, chunk_text in content_chunks]
@@ -0,0 +1,121 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from collections import Counter
+from dotenv import load_dotenv
+
+load_dotenv()
+
+PIPELINE_BATCH_WAIT_MS = float(os.getenv("PIPELINE_BATCH_WAIT_MS", "5"))
+PIPELINE_MAX_BATCH_SIZE = int(os.getenv("PIPELINE_MAX_BATCH_SIZE", "8"))
+
+
+class PipelineServer:
+    def __init__(
+        self,
+        name: str,
+        load,
+        run,
+        batch_wait_ms: float = PIPELINE_BATCH_WAIT_MS,
+        max_batch_size: int = PIPELINE_MAX_BATCH_SIZE,
+    ):
+        self.name = name
+        self.load = load
+        self.run = run
+        self.batch_wait_ms = batch_wait_ms
+        self.max_batch_size = max(1, max_batch_size)
+        self.model = None
+        self.loop = None
+        self.queue = None
+        self.worker = None
+        self.queue_depths = Counter()
+        self.batch_sizes = Counter()
+        self.requests = 0
+
+    async def submit(self, prompt: str, **params):
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop or self.worker is None or self.worker.done():
+            self.loop = loop
+            self.queue = asyncio.Queue()
+            self.worker = loop.create_task(self.serve())
+        future = loop.create_future()
+        self.requests += 1
+        await self.queue.put((prompt, params, future))
+        return await future
+
+    async def collect(self):
+        batch = [await self.queue.get()]
+        deadline = time.monotonic() + self.batch_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        self.queue_depths[len(batch) + self.queue.qsize()] += 1
+        return batch
+
+    async def serve(self):
+        while True:
+            batch = await self.collect()
+            # Requests can only share a forward pass when their generation settings match.
+            groups = {}
+            for item in batch:
+                groups.setdefault(tuple(sorted(item[1].items())), []).append(item)
+            for params, items in groups.items():
+                await self.run_batch(items=items, params=dict(params))
+
+    async def run_batch(self, items, params):
+        self.batch_sizes[len(items)] += 1
+        start = time.perf_counter()
+        try:
+            if self.model is None:
+                self.model = await asyncio.to_thread(self.load)
+            results = await asyncio.to_thread(
+                self.run, self.model, [item[0] for item in items], params
+            )
+        except Exception as e:
+            logging.info(f"Pipeline {self.name} failed on a batch of {len(items)}: {e}")
+            for _, _, future in items:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        logging.info(
+            f"Pipeline {self.name} ran a batch of {len(items)} in {time.perf_counter() - start:.2f}s."
+        )
+        for (_, _, future), result in zip(items, results):
+            if not future.done():
+                future.set_result(result)
+
+    def get_metrics(self):
+        return {
+            "loaded": self.model is not None,
+            "requests": self.requests,
+            "queued": self.queue.qsize() if self.queue else 0,
+            "queue_depth_histogram": {
+                str(depth): count for depth, count in sorted(self.queue_depths.items())
+            },
+            "batch_size_histogram": {
+                str(size): count for size, count in sorted(self.batch_sizes.items())
+            },
+        }
+
+
+pipeline_servers = {}
+pipeline_servers_lock = threading.Lock()
+
+
+def get_pipeline_server(name: str, load, run) -> PipelineServer:
+    with pipeline_servers_lock:
+        if name not in pipeline_servers:
+            pipeline_servers[name] = PipelineServer(name=name, load=load, run=run)
+        return pipeline_servers[name]
+
+
+def get_pipeline_metrics():
+    with pipeline_servers_lock:
+        return {name: server.get_metrics() for name, server in pipeline_servers.items()}
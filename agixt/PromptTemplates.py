@@ -0,0 +1,112 @@
+import os
+import re
+import time
+import threading
+from functools import lru_cache
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Seconds a database prompt is trusted before its content is checked for changes
+# made by other workers. Edits through this worker invalidate immediately.
+PROMPT_CACHE_TTL = float(os.getenv("PROMPT_CACHE_TTL", "5"))
+PLACEHOLDER_PATTERN = re.compile(r"(?<!{){([^{}\n]+)}(?!})")
+
+
+class PromptTemplate:
+    def __init__(self, text: str):
+        self.text = text
+        self.segments = []
+        position = 0
+        for match in PLACEHOLDER_PATTERN.finditer(text):
+            self.segments.append((False, text[position : match.start()]))
+            self.segments.append((True, match.group(1)))
+            position = match.end()
+        self.segments.append((False, text[position:]))
+
+    def render_parts(self, **kwargs):
+        parts = []
+        for is_placeholder, value in self.segments:
+            if not is_placeholder:
+                parts.append(value)
+                continue
+            if value not in kwargs:
+                parts.append(f"{{{value}}}")
+                continue
+            argument = kwargs[value]
+            if isinstance(argument, list):
+                parts.extend(str(x) for x in argument)
+            else:
+                parts.append(str(argument))
+        return parts
+
+    def render(self, **kwargs):
+        return "".join(self.render_parts(**kwargs))
+
+
+@lru_cache(maxsize=256)
+def compile_template(text: str) -> PromptTemplate:
+    return PromptTemplate(text)
+
+
+class PromptTemplateCache:
+    def __init__(self, ttl: float = PROMPT_CACHE_TTL):
+        self.ttl = ttl
+        self.entries = {}
+        self.versions = {}
+        self.lock = threading.Lock()
+
+    def get(self, prompt_name: str, prompt_category: str, version, load):
+        # version is the file mtime for file prompts and None for database prompts,
+        # which are reloaded once the TTL passes and recompiled only if they changed.
+        # Invalidations are counted per prompt name, a category without its own copy of
+        # a prompt falls back to the Default one and is cached under its own key.
+        key = (prompt_category, prompt_name)
+        with self.lock:
+            entry = self.entries.get(key)
+            current = self.versions.get(prompt_name, 0)
+        if entry and entry["version"] == (version, current):
+            if version is not None or time.monotonic() - entry["checked"] < self.ttl:
+                return entry["template"]
+        text = load()
+        if text is None:
+            return None
+        if entry and entry["template"].text == text:
+            template = entry["template"]
+        else:
+            template = compile_template(text)
+        with self.lock:
+            self.entries[key] = {
+                "template": template,
+                "version": (version, current),
+                "checked": time.monotonic(),
+            }
+        return template
+
+    def invalidate_name(self, prompt_name: str):
+        # Drops the prompt from every category, any of them may be serving it as a fallback.
+        with self.lock:
+            self.versions[prompt_name] = self.versions.get(prompt_name, 0) + 1
+            for key in [key for key in self.entries if key[1] == prompt_name]:
+                del self.entries[key]
+
+    def invalidate(self, prompt_name: str, prompt_category: str = "Default"):
+        self.invalidate_name(prompt_name=prompt_name)
+
+
+prompt_template_cache = PromptTemplateCache()
+
+
+def get_prompt_template(prompt_name: str, prompt_category: str, version, load):
+    return prompt_template_cache.get(
+        prompt_name=prompt_name,
+        prompt_category=prompt_category,
+        version=version,
+        load=load,
+    )
+
+
+def invalidate_prompt_template(prompt_name: str, prompt_category: str = "Default"):
+    prompt_template_cache.invalidate(
+        prompt_name=prompt_name, prompt_category=prompt_category
+    )
@@ -0,0 +1,82 @@
+import os
+import threading
+import tiktoken
+from collections import OrderedDict
+from typing import List
+from dotenv import load_dotenv
+
+load_dotenv()
+
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "4096"))
+
+encodings = {}
+
+
+def get_encoding(encoding_name: str = "cl100k_base"):
+    if encoding_name not in encodings:
+        encodings[encoding_name] = tiktoken.get_encoding(encoding_name)
+    return encodings[encoding_name]
+
+
+def get_tokens(text: str) -> int:
+    return len(get_encoding().encode(str(text), disallowed_special=()))
+
+
+def count_tokens(texts: List[str]) -> List[int]:
+    if not texts:
+        return []
+    encoded = get_encoding().encode_batch(
+        [str(text) for text in texts], disallowed_special=()
+    )
+    return [len(tokens) for tokens in encoded]
+
+
+class TokenCountCache:
+    def __init__(self, max_size: int = TOKEN_CACHE_SIZE):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def count(self, texts: List[str]) -> List[int]:
+        counts = {}
+        with self.lock:
+            for text in texts:
+                if text in self.entries:
+                    self.entries.move_to_end(text)
+                    counts[text] = self.entries[text]
+                    self.hits += 1
+        misses = list(dict.fromkeys(text for text in texts if text not in counts))
+        if misses:
+            new_counts = dict(zip(misses, count_tokens(misses)))
+            counts.update(new_counts)
+            with self.lock:
+                self.misses += len(misses)
+                for text, count in new_counts.items():
+                    self.entries[text] = count
+                    self.entries.move_to_end(text)
+                while len(self.entries) > self.max_size:
+                    self.entries.popitem(last=False)
+        return [counts[text] for text in texts]
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "size": len(self.entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+token_cache = TokenCountCache()
+
+
+def count_cached_tokens(texts: List[str]) -> int:
+    # Parts are counted separately, so the total can differ from the joined text by a token per boundary.
+    return sum(token_cache.count([str(text) for text in texts if text]))
+
+
+def get_token_cache_stats():
+    return token_cache.get_stats()
@@ -7,7 +7,8 @@ import logging
 import asyncio
 import urllib.parse
 from urllib.parse import urlparse
-from playwright.async_api import async_playwright
+from BrowserPool import get_page_content
+from Crawler import Crawler, VisitedIndex, crawl_links, get_deadline
 from bs4 import BeautifulSoup
 from agixtsdk import AGiXTSDK
 from typing import List
@@ -33,147 +34,108 @@ class Websearch:
         self.agent_settings = self.agent_config["settings"]
         self.requirements = ["agixtsdk"]
         self.failures = []
-        self.browsed_links = []
-        self.tasks = []
+        self.browsed_links = VisitedIndex()
 
     async def get_web_content(self, url):
         try:
-            async with async_playwright() as p:
-                browser = await p.chromium.launch()
-                context = await browser.new_context()
-                page = await context.new_page()
-                await page.goto(url)
-                content = await page.content()
-
-                # Scrape links and their titles
-                links = await page.query_selector_all("a")
-                link_list = []
-                for link in links:
-                    title = await page.evaluate("(link) => link.textContent", link)
-                    title = title.replace("\n", "")
-                    title = title.replace("\t", "")
-                    title = title.replace("  ", "")
-                    href = await page.evaluate("(link) => link.href", link)
-                    link_list.append((title, href))
-
-                await browser.close()
-                soup = BeautifulSoup(content, "html.parser")
-                text_content = soup.get_text()
-                text_content = " ".join(text_content.split())
-                ApiClient.learn_url(agent_name=self.agent_name, url=url)
-                self.browsed_links.append(url)
-                return text_content, link_list
+            content, links = await get_page_content(url=url)
+            # Scrape links and their titles
+            link_list = []
+            for title, href in links:
+                title = title.replace("\n", "")
+                title = title.replace("\t", "")
+                title = title.replace("  ", "")
+                link_list.append((title, href))
+            soup = BeautifulSoup(content, "html.parser")
+            text_content = soup.get_text()
+            text_content = " ".join(text_content.split())
+            await asyncio.to_thread(
+                ApiClient.learn_url, agent_name=self.agent_name, url=url
+            )
+            self.browsed_links.add(url)
+            return text_content, link_list
         except:
             return None, None
 
-    async def resursive_browsing(self, user_input, links):
-        try:
-            words = links.split()
+    def get_urls(self, links):
+        if isinstance(links, str):
             links = [
-                word for word in words if urlparse(word).scheme in ["http", "https"]
+                word
+                for word in links.split()
+                if urlparse(word).scheme in ["http", "https"]
             ]
+        urls = []
+        for link in links if links is not None else []:
+            url = link["href"] if isinstance(link, dict) and "href" in link else link
+            url = re.sub(r"^.*?(http)", r"http", str(url))
+            # Check if url is an actual url
+            if url.startswith("http"):
+                urls.append(url)
+        return urls
+
+    async def pick_a_link(self, user_input, url, link_list):
+        if len(link_list) > 5:
+            link_list = link_list[:3]
+        try:
+            pick_a_link = await asyncio.to_thread(
+                ApiClient.prompt_agent,
+                agent_name=self.agent_name,
+                prompt_name="Pick-a-Link",
+                prompt_args={
+                    "url": url,
+                    "links": link_list,
+                    "visited_links": list(self.browsed_links),
+                    "disable_memory": True,
+                    "browse_links": False,
+                    "user_input": user_input,
+                    "context_results": 0,
+                },
+            )
         except:
-            links = links
-        if links is not None:
-            for link in links:
-                if "href" in link:
-                    try:
-                        url = link["href"]
-                    except:
-                        url = link
-                else:
-                    url = link
-                url = re.sub(r"^.*?(http)", r"http", url)
-                if url in self.browsed_links:
-                    continue
-                # Check if url is an actual url
-                if url.startswith("http"):
-                    logging.info(f"Scraping: {url}")
-                    if url not in self.browsed_links:
-                        self.browsed_links.append(url)
-                        (
-                            collected_data,
-                            link_list,
-                        ) = await self.get_web_content(url=url)
-        if links is not None:
-            for link in links:
-                if "href" in link:
-                    try:
-                        url = link["href"]
-                    except:
-                        url = link
-                else:
-                    url = link
-                url = re.sub(r"^.*?(http)", r"http", url)
-                if url in self.browsed_links:
-                    continue
-                # Check if url is an actual url
-                if url.startswith("http"):
-                    logging.info(f"Scraping: {url}")
-                    if url not in self.browsed_links:
-                        self.browsed_links.append(url)
-                        (
-                            collected_data,
-                            link_list,
-                        ) = await self.get_web_content(url=url)
-                        if link_list is not None:
-                            if len(link_list) > 0:
-                                if len(link_list) > 5:
-                                    link_list = link_list[:3]
-                                try:
-                                    pick_a_link = ApiClient.prompt_agent(
-                                        agent_name=self.agent_name,
-                                        prompt_name="Pick-a-Link",
-                                        prompt_args={
-                                            "url": url,
-                                            "links": link_list,
-                                            "visited_links": self.browsed_links,
-                                            "disable_memory": True,
-                                            "browse_links": False,
-                                            "user_input": user_input,
-                                            "context_results": 0,
-                                        },
-                                    )
-                                    if not pick_a_link.startswith("None"):
-                                        logging.info(
-                                            f"AI has decided to click: {pick_a_link}"
-                                        )
-                                        await self.resursive_browsing(
-                                            user_input=user_input, links=pick_a_link
-                                        )
-                                except:
-                                    logging.info(f"Issues reading {url}. Moving on...")
+            logging.info(f"Issues reading {url}. Moving on...")
+            return []
+        if pick_a_link.startswith("None"):
+            return []
+        logging.info(f"AI has decided to click: {pick_a_link}")
+        return self.get_urls(pick_a_link)
+
+    async def resursive_browsing(
+        self, user_input, links, max_depth: int = 3, deadline: float = None
+    ):
+        # Every search result is browsed at once, each page lets the agent pick the
+        # next link to follow until max_depth or the deadline is reached.
+        crawler = Crawler(
+            fetch=self.get_web_content,
+            expand=lambda url, text, link_list, depth: self.pick_a_link(
+                user_input=user_input, url=url, link_list=link_list
+            ),
+            max_depth=int(max_depth),
+            deadline=deadline,
+            visited=self.browsed_links,
+        )
+        await crawler.crawl(self.get_urls(links))
 
     async def ddg_search(self, query: str, proxy=None) -> List[str]:
-        async with async_playwright() as p:
-            launch_options = {}
-            if proxy:
-                launch_options["proxy"] = {"server": proxy}
-            browser = await p.chromium.launch(**launch_options)
-            context = await browser.new_context()
-            page = await context.new_page()
-            url = f"https://lite.duckduckgo.com/lite/?q={query}"
-            await page.goto(url)
-            links = await page.query_selector_all("a")
-            results = []
-            for link in links:
-                summary = await page.evaluate("(link) => link.textContent", link)
-                summary = summary.replace("\n", "").replace("\t", "").replace("  ", "")
-                href = await page.evaluate("(link) => link.href", link)
-                parsed_url = urllib.parse.urlparse(href)
-                query_params = urllib.parse.parse_qs(parsed_url.query)
-                uddg = query_params.get("uddg", [None])[0]
-                if uddg:
-                    href = urllib.parse.unquote(uddg)
-                if summary:
-                    results.append(f"{summary} - {href}")
-            await browser.close()
+        url = f"https://lite.duckduckgo.com/lite/?q={query}"
+        content, links = await get_page_content(url=url, proxy=proxy)
+        results = []
+        for summary, href in links:
+            summary = summary.replace("\n", "").replace("\t", "").replace("  ", "")
+            parsed_url = urllib.parse.urlparse(href)
+            query_params = urllib.parse.parse_qs(parsed_url.query)
+            uddg = query_params.get("uddg", [None])[0]
+            if uddg:
+                href = urllib.parse.unquote(uddg)
+            if summary:
+                results.append(f"{summary} - {href}")
         return results
 
     async def search(self, query: str) -> List[str]:
         if self.searx_instance_url == "":
             try:  # SearXNG - List of these at https://searx.space/
-                response = requests.get("https://searx.space/data/instances.json")
+                response = await asyncio.to_thread(
+                    requests.get, "https://searx.space/data/instances.json"
+                )
                 data = json.loads(response.text)
                 if self.failures != []:
                     for failure in self.failures:
@@ -185,18 +147,23 @@ class Websearch:
             except:  # Select default remote server that typically works if unable to get list.
                 self.searx_instance_url = "https://search.us.projectsegfau.lt"
             self.agent_settings["SEARXNG_INSTANCE_URL"] = self.searx_instance_url
-            ApiClient.update_agent_settings(
-                agent_name=self.agent_name, settings=self.agent_settings
+            await asyncio.to_thread(
+                ApiClient.update_agent_settings,
+                agent_name=self.agent_name,
+                settings=self.agent_settings,
             )
         server = self.searx_instance_url.rstrip("/")
         self.agent_settings["SEARXNG_INSTANCE_URL"] = server
-        ApiClient.update_agent_settings(
-            agent_name=self.agent_name, settings=self.agent_settings
+        await asyncio.to_thread(
+            ApiClient.update_agent_settings,
+            agent_name=self.agent_name,
+            settings=self.agent_settings,
         )
         endpoint = f"{server}/search"
         try:
             logging.info(f"Trying to connect to SearXNG Search at {endpoint}...")
-            response = requests.get(
+            response = await asyncio.to_thread(
+                requests.get,
                 endpoint,
                 params={
                     "q": query,
@@ -219,8 +186,10 @@ class Websearch:
             if len(self.failures) > 5:
                 logging.info("Failed 5 times. Trying DDG...")
                 self.agent_settings["SEARXNG_INSTANCE_URL"] = ""
-                ApiClient.update_agent_settings(
-                    agent_name=self.agent_name, settings=self.agent_settings
+                await asyncio.to_thread(
+                    ApiClient.update_agent_settings,
+                    agent_name=self.agent_name,
+                    settings=self.agent_settings,
                 )
                 return await self.ddg_search(query=query)
             times = "times" if len(self.failures) != 1 else "time"
@@ -231,38 +200,38 @@ class Websearch:
             self.searx_instance_url = ""
             return await self.search(query=query)
 
-    async def browse_links_in_input(self, user_input: str = "", search_depth: int = 0):
+    async def browse_links_in_input(
+        self, user_input: str = "", search_depth: int = 0, deadline: float = None
+    ):
         links = re.findall(r"(?P<url>https?://[^\s]+)", user_input)
         if links is not None and len(links) > 0:
-            for link in links:
-                if link not in self.browsed_links:
-                    logging.info(f"Browsing link: {link}")
-                    self.browsed_links.append(link)
-                    text_content, link_list = await self.get_web_content(url=link)
-                    if int(search_depth) > 0:
-                        if link_list is not None and len(link_list) > 0:
-                            i = 0
-                            for sublink in link_list:
-                                if sublink[1] not in self.browsed_links:
-                                    logging.info(f"Browsing link: {sublink[1]}")
-                                    if i <= search_depth:
-                                        (
-                                            text_content,
-                                            link_list,
-                                        ) = await self.get_web_content(url=sublink[1])
-                                        i = i + 1
+            await crawl_links(
+                urls=links,
+                fetch=self.get_web_content,
+                search_depth=search_depth,
+                visited=self.browsed_links,
+                deadline=deadline,
+            )
 
     async def websearch_agent(
         self,
         user_input: str = "What are the latest breakthroughs in AI?",
         websearch_depth: int = 0,
         websearch_timeout: int = 0,
+        deadline: float = None,
     ):
+        # Links in the input and search results share one websearch_timeout, unless the
+        # caller already started the clock for the whole request.
+        if deadline is None:
+            deadline = get_deadline(websearch_timeout)
         await self.browse_links_in_input(
-            user_input=user_input, search_depth=websearch_depth
+            user_input=user_input,
+            search_depth=websearch_depth,
+            deadline=deadline,
         )
         if websearch_depth > 0:
-            search_string = ApiClient.prompt_agent(
+            search_string = await asyncio.to_thread(
+                ApiClient.prompt_agent,
                 agent_name=self.agent_name,
                 prompt_name="WebSearch",
                 prompt_args={
@@ -281,18 +250,16 @@ class Websearch:
                 if len(links) > websearch_depth:
                     links = links[:websearch_depth]
                 if links is not None and len(links) > 0:
-                    task = asyncio.create_task(
-                        self.resursive_browsing(user_input=user_input, links=links)
-                    )
-                    self.tasks.append(task)
-
-                if int(websearch_timeout) == 0:
-                    await asyncio.gather(*self.tasks)
-                else:
-                    logging.info(
-                        f"Web searching for {websearch_timeout} seconds... Please wait..."
+                    if int(websearch_timeout) > 0:
+                        logging.info(
+                            f"Web searching for up to {websearch_timeout} seconds... Please wait..."
+                        )
+                    await self.resursive_browsing(
+                        user_input=user_input,
+                        links=links,
+                        max_depth=websearch_depth,
+                        deadline=deadline,
                     )
-                    await asyncio.sleep(int(websearch_timeout))
                     logging.info("Websearch tasks completed.")
             else:
                 logging.info("No results found.")
@@ -2,36 +2,45 @@ import uvicorn
 import os
 import logging
 import base64
+import json
 import string
 import random
 import time
 from fastapi import FastAPI, HTTPException, Depends, Header
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from Interactions import Interactions, get_tokens
-from Embedding import Embedding
+from Interactions import Interactions
+from Tokens import get_tokens, get_token_cache_stats
+from Embedding import get_embedding
+from AgentRegistry import get_agent, get_agent_registry_metrics
+from AsyncProvider import close_http_clients
+from PipelineServer import get_pipeline_metrics
+from BrowserPool import get_browser_pool_metrics, close_browser_pools
 from dotenv import load_dotenv
 
 load_dotenv()
 AGIXT_API_KEY = os.getenv("AGIXT_API_KEY", None)
 db_connected = True if os.getenv("DB_CONNECTED", "false").lower() == "true" else False
 if db_connected:
-    from db.Agent import Agent, add_agent, delete_agent, rename_agent, get_agents
+    from db.Agent import add_agent, delete_agent, rename_agent, get_agents
     from db.Chain import Chain
     from db.Prompts import Prompts
     from db.History import (
         get_conversation,
+        get_conversation_page,
         delete_history,
         delete_message,
         get_conversations,
         new_conversation,
     )
 else:
-    from fb.Agent import Agent, add_agent, delete_agent, rename_agent, get_agents
+    from fb.Agent import add_agent, delete_agent, rename_agent, get_agents
     from fb.Chain import Chain
     from fb.Prompts import Prompts
     from fb.History import (
         get_conversation,
+        get_conversation_page,
         delete_history,
         delete_message,
         get_conversations,
@@ -41,7 +50,11 @@ else:
 
 from typing import Optional, Dict, List, Any
 from Providers import get_provider_options, get_providers
-from Embedding import get_embedding_providers, get_embedders
+from Embedding import (
+    get_embedding_providers,
+    get_embedders,
+    get_embedding_cache_stats,
+)
 from Extensions import Extensions
 from Chains import Chains
 from readers.github import GithubReader
@@ -66,6 +79,11 @@ app = FastAPI(
     docs_url="/",
 )
 
+if db_connected:
+    from DBConnection import DBSessionMiddleware
+
+    app.add_middleware(DBSessionMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -75,6 +93,12 @@ app.add_middleware(
 )
 
 
+@app.on_event("shutdown")
+async def shutdown():
+    await close_http_clients()
+    await close_browser_pools()
+
+
 def verify_api_key(authorization: str = Header(None)):
     # Check if the API key is set up in the environment
     if AGIXT_API_KEY:
@@ -137,7 +161,7 @@ class PromptCategoryList(BaseModel):
 
 
 class Completions(BaseModel):
-    # Everything in this class except prompt, n, and model (agent_name) are unused currently.
+    # Everything in this class except prompt, n, stream, and model (agent_name) are unused currently.
     prompt: str
     max_tokens: int = 100
     temperature: float = 0.9
@@ -271,6 +295,7 @@ class HistoryModel(BaseModel):
     conversation_name: str
     limit: int = 100
     page: int = 1
+    cursor: Optional[str] = None
 
 
 class ConversationHistoryModel(BaseModel):
@@ -358,7 +383,7 @@ async def renameagent(agent_name: str, new_name: AgentNewName) -> ResponseMessag
 async def update_agent_settings(
     agent_name: str, settings: AgentSettings
 ) -> ResponseMessage:
-    update_config = Agent(agent_name=agent_name).update_agent_config(
+    update_config = get_agent(agent_name=agent_name).update_agent_config(
         new_config=settings.settings, config_key="settings"
     )
     return ResponseMessage(message=update_config)
@@ -377,7 +402,7 @@ async def query_memories(
         collection_number = int(collection_number)
     except:
         collection_number = 0
-    agent_config = Agent(agent_name=agent_name).get_agent_config()
+    agent_config = get_agent(agent_name=agent_name).get_agent_config()
     memories = await WebsiteReader(
         agent_name=agent_name,
         agent_config=agent_config,
@@ -386,6 +411,7 @@ async def query_memories(
         user_input=memory.user_input,
         limit=memory.limit,
         min_relevance_score=memory.min_relevance_score,
+        include_embeddings=True,
     )
     return {"memories": memories}
 
@@ -396,7 +422,7 @@ async def query_memories(
     dependencies=[Depends(verify_api_key)],
 )
 async def learn_text(agent_name: str, data: TextMemoryInput) -> ResponseMessage:
-    agent_config = Agent(agent_name=agent_name).get_agent_config()
+    agent_config = get_agent(agent_name=agent_name).get_agent_config()
     await WebsiteReader(
         agent_name=agent_name,
         agent_config=agent_config,
@@ -423,7 +449,7 @@ async def learn_file(agent_name: str, file: FileInput) -> ResponseMessage:
     with open(file_path, "wb") as f:
         f.write(file_content)
     try:
-        agent_config = Agent(agent_name=agent_name).get_agent_config()
+        agent_config = get_agent(agent_name=agent_name).get_agent_config()
         await FileReader(
             agent_name=agent_name,
             agent_config=agent_config,
@@ -448,7 +474,7 @@ async def learn_file(agent_name: str, file: FileInput) -> ResponseMessage:
     dependencies=[Depends(verify_api_key)],
 )
 async def learn_url(agent_name: str, url: UrlInput) -> ResponseMessage:
-    agent_config = Agent(agent_name=agent_name).get_agent_config()
+    agent_config = get_agent(agent_name=agent_name).get_agent_config()
     await WebsiteReader(
         agent_name=agent_name,
         agent_config=agent_config,
@@ -463,7 +489,7 @@ async def learn_url(agent_name: str, url: UrlInput) -> ResponseMessage:
     dependencies=[Depends(verify_api_key)],
 )
 async def learn_github_repo(agent_name: str, git: GitHubInput) -> ResponseMessage:
-    agent_config = Agent(agent_name=agent_name).get_agent_config()
+    agent_config = get_agent(agent_name=agent_name).get_agent_config()
     await GithubReader(
         agent_name=agent_name,
         agent_config=agent_config,
@@ -534,7 +560,7 @@ async def delete_agent_memory(
 async def update_agent_commands(
     agent_name: str, commands: AgentCommands
 ) -> ResponseMessage:
-    update_config = Agent(agent_name=agent_name).update_agent_config(
+    update_config = get_agent(agent_name=agent_name).update_agent_config(
         new_config=commands.commands, config_key="commands"
     )
     return ResponseMessage(message=update_config)
@@ -558,7 +584,7 @@ async def getagents():
     "/api/agent/{agent_name}", tags=["Agent"], dependencies=[Depends(verify_api_key)]
 )
 async def get_agentconfig(agent_name: str):
-    agent_config = Agent(agent_name=agent_name).get_agent_config()
+    agent_config = get_agent(agent_name=agent_name).get_agent_config()
     return {"agent": agent_config}
 
 
@@ -596,18 +622,29 @@ async def get_conversations_list():
     dependencies=[Depends(verify_api_key)],
 )
 async def get_conversation_history(history: HistoryModel):
-    conversation_history = get_conversation(
+    if history.page > 1 and not history.cursor:
+        conversation_history = get_conversation(
+            agent_name=history.agent_name,
+            conversation_name=history.conversation_name,
+            limit=history.limit,
+            page=history.page,
+        )
+        if conversation_history is None:
+            conversation_history = []
+        if "interactions" in conversation_history:
+            conversation_history = conversation_history["interactions"]
+        return {"conversation_history": conversation_history, "next_cursor": None}
+    # Pass next_cursor back as cursor to get the following page.
+    page = get_conversation_page(
         agent_name=history.agent_name,
         conversation_name=history.conversation_name,
         limit=history.limit,
-        page=history.page,
+        cursor=history.cursor,
     )
-
-    if conversation_history is None:
-        conversation_history = []
-    if "interactions" in conversation_history:
-        conversation_history = conversation_history["interactions"]
-    return {"conversation_history": conversation_history}
+    return {
+        "conversation_history": page["interactions"],
+        "next_cursor": page["next_cursor"],
+    }
 
 
 @app.post(
@@ -669,6 +706,56 @@ async def prompt_agent(agent_name: str, agent_prompt: AgentPrompt):
     return {"response": str(response)}
 
 
+def stream_completion(agent, prompt: Completions, model: str, chat: bool = False):
+    characters = string.ascii_letters + string.digits
+    random_chars = "".join(random.choice(characters) for _ in range(15))
+    completion_id = f"chatcmpl-{random_chars}" if chat else f"cmpl-{random_chars}"
+    created = int(time.time())
+
+    def event(text, finish_reason=None):
+        if chat:
+            choice = {
+                "index": 0,
+                "delta": {"content": text} if text else {},
+                "finish_reason": finish_reason,
+            }
+        else:
+            choice = {
+                "text": text,
+                "index": 0,
+                "logprobs": None,
+                "finish_reason": finish_reason,
+            }
+        chunk = {
+            "id": completion_id,
+            "object": "chat.completion.chunk" if chat else "text_completion",
+            "created": created,
+            "model": model,
+            "choices": [choice],
+        }
+        return f"data: {json.dumps(chunk)}\n\n"
+
+    async def events():
+        try:
+            async for text in agent.run_stream(
+                user_input=prompt.prompt,
+                prompt="Custom Input",
+                context_results=3,
+            ):
+                if text:
+                    yield event(text)
+        except Exception as e:
+            # The status code is already sent, so the error goes out as the last event.
+            logging.info(f"Streaming error: {e}")
+            error = {"error": {"message": str(e), "type": type(e).__name__}}
+            yield f"data: {json.dumps(error)}\n\n"
+        else:
+            yield event("", finish_reason="stop")
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
 @app.post(
     "/api/v1/completions", tags=["Completions"], dependencies=[Depends(verify_api_key)]
 )
@@ -683,6 +770,8 @@ async def completion(prompt: Completions):
             model = "undefined"
     else:
         model = "undefined"
+    if prompt.stream:
+        return stream_completion(agent=agent, prompt=prompt, model=model)
     response = await agent.run(
         user_input=prompt.prompt,
         prompt="Custom Input",
@@ -732,6 +821,8 @@ async def chat_completion(prompt: Completions):
             model = "undefined"
     else:
         model = "undefined"
+    if prompt.stream:
+        return stream_completion(agent=agent, prompt=prompt, model=model, chat=True)
     response = await agent.run(
         user_input=prompt.prompt,
         prompt="Custom Input",
@@ -775,10 +866,10 @@ async def chat_completion(prompt: Completions):
 )
 async def embedding(embedding: EmbeddingModel):
     agent_name = embedding.model
-    agent_config = Agent(agent_name=agent_name).get_agent_config()
+    agent_config = get_agent(agent_name=agent_name).get_agent_config()
     agent_settings = agent_config["settings"] if "settings" in agent_config else None
     tokens = get_tokens(embedding.input)
-    embedding = Embedding(agent_settings=agent_settings).embed_text(
+    embedding = get_embedding(agent_settings=agent_settings).embed_text(
         text=embedding.input
     )
     return {
@@ -795,7 +886,7 @@ async def embedding(embedding: EmbeddingModel):
     dependencies=[Depends(verify_api_key)],
 )
 async def get_commands(agent_name: str):
-    agent = Agent(agent_name=agent_name)
+    agent = get_agent(agent_name=agent_name)
     return {"commands": agent.AGENT_CONFIG["commands"]}
 
 
@@ -807,23 +898,21 @@ async def get_commands(agent_name: str):
 async def toggle_command(
     agent_name: str, payload: ToggleCommandPayload
 ) -> ResponseMessage:
-    agent = Agent(agent_name=agent_name)
+    agent = get_agent(agent_name=agent_name)
+    # Work on a copy, the cached agent is shared until the update invalidates it.
+    commands = dict(agent.AGENT_CONFIG["commands"])
     try:
         if payload.command_name == "*":
-            for each_command_name in agent.AGENT_CONFIG["commands"]:
-                agent.AGENT_CONFIG["commands"][each_command_name] = payload.enable
+            for each_command_name in commands:
+                commands[each_command_name] = payload.enable
 
-            agent.update_agent_config(
-                new_config=agent.AGENT_CONFIG["commands"], config_key="commands"
-            )
+            agent.update_agent_config(new_config=commands, config_key="commands")
             return ResponseMessage(
                 message=f"All commands enabled for agent '{agent_name}'."
             )
         else:
-            agent.AGENT_CONFIG["commands"][payload.command_name] = payload.enable
-            agent.update_agent_config(
-                new_config=agent.AGENT_CONFIG["commands"], config_key="commands"
-            )
+            commands[payload.command_name] = payload.enable
+            agent.update_agent_config(new_config=commands, config_key="commands")
             return ResponseMessage(
                 message=f"Command '{payload.command_name}' toggled for agent '{agent_name}'."
             )
@@ -1189,5 +1278,16 @@ async def get_extensions():
     return {"extensions": extensions}
 
 
+@app.get("/api/metrics", tags=["Metrics"], dependencies=[Depends(verify_api_key)])
+async def get_metrics():
+    return {
+        "agent_registry": get_agent_registry_metrics(),
+        "browser_pool": get_browser_pool_metrics(),
+        "embedding_cache": get_embedding_cache_stats(),
+        "pipelines": get_pipeline_metrics(),
+        "token_cache": get_token_cache_stats(),
+    }
+
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=7437)
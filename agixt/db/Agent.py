@@ -1,4 +1,5 @@
 import json
+from sqlalchemy import select
 from DBConnection import (
     Agent as AgentModel,
     AgentSetting as AgentSettingModel,
@@ -15,6 +16,7 @@ from DBConnection import (
 )
 from Providers import Providers
 from Extensions import Extensions
+from AgentRegistry import invalidate_agent
 
 DEFAULT_SETTINGS = {
     "provider": "gpt4free",
@@ -56,6 +58,7 @@ def add_agent(agent_name, provider_settings=None, commands=None):
     )
     session.add(agent_setting)
     session.commit()
+    invalidate_agent(agent_name=agent_name)
 
     return {"message": f"Agent {agent_name} created."}
 
@@ -65,28 +68,29 @@ def delete_agent(agent_name):
     if not agent:
         return {"message": f"Agent {agent_name} not found."}, 404
 
-    # Delete associated chain steps
-    chain_steps = session.query(ChainStep).filter_by(agent_id=agent.id).all()
-    for chain_step in chain_steps:
-        # Delete associated chain step arguments
-        session.query(ChainStepArgument).filter_by(chain_step_id=chain_step.id).delete()
-        # Delete associated chain step responses
-        session.query(ChainStepResponse).filter_by(chain_step_id=chain_step.id).delete()
-        session.delete(chain_step)
+    # Delete associated chain steps with their arguments and responses
+    chain_step_ids = select(ChainStep.id).where(ChainStep.agent_id == agent.id)
+    session.query(ChainStepArgument).filter(
+        ChainStepArgument.chain_step_id.in_(chain_step_ids)
+    ).delete(synchronize_session=False)
+    session.query(ChainStepResponse).filter(
+        ChainStepResponse.chain_step_id.in_(chain_step_ids)
+    ).delete(synchronize_session=False)
+    session.query(ChainStep).filter(ChainStep.agent_id == agent.id).delete(
+        synchronize_session=False
+    )
 
     # Delete associated agent commands
-    agent_commands = session.query(AgentCommand).filter_by(agent_id=agent.id).all()
-    for agent_command in agent_commands:
-        session.delete(agent_command)
-
-    # Delete associated agent_provider records
-    agent_providers = session.query(AgentProvider).filter_by(agent_id=agent.id).all()
-    for agent_provider in agent_providers:
-        # Delete associated agent_provider_settings
-        session.query(AgentProviderSetting).filter_by(
-            agent_provider_id=agent_provider.id
-        ).delete()
-        session.delete(agent_provider)
+    session.query(AgentCommand).filter_by(agent_id=agent.id).delete()
+
+    # Delete associated agent_provider records and their settings
+    agent_provider_ids = select(AgentProvider.id).where(
+        AgentProvider.agent_id == agent.id
+    )
+    session.query(AgentProviderSetting).filter(
+        AgentProviderSetting.agent_provider_id.in_(agent_provider_ids)
+    ).delete(synchronize_session=False)
+    session.query(AgentProvider).filter_by(agent_id=agent.id).delete()
 
     # Delete associated agent settings
     session.query(AgentSettingModel).filter_by(agent_id=agent.id).delete()
@@ -94,6 +98,7 @@ def delete_agent(agent_name):
     # Delete the agent
     session.delete(agent)
     session.commit()
+    invalidate_agent(agent_name=agent_name)
 
     return {"message": f"Agent {agent_name} deleted."}, 200
 
@@ -105,6 +110,8 @@ def rename_agent(agent_name, new_name):
 
     agent.name = new_name
     session.commit()
+    invalidate_agent(agent_name=agent_name)
+    invalidate_agent(agent_name=new_name)
 
     return {"message": f"Agent {agent_name} renamed to {new_name}."}, 200
 
@@ -206,9 +213,8 @@ class Agent:
                 self.PROVIDER_SETTINGS[setting] = DEFAULT_SETTINGS[setting]
         self.AI_PROVIDER = self.AGENT_CONFIG["settings"]["provider"]
         self.PROVIDER = Providers(self.AI_PROVIDER, **self.PROVIDER_SETTINGS)
-        self.available_commands = Extensions(
-            agent_config=self.AGENT_CONFIG
-        ).get_available_commands()
+        self.extensions = Extensions(agent_config=self.AGENT_CONFIG)
+        self.available_commands = self.extensions.available_commands
 
     def load_config_keys(self):
         config_keys = [
@@ -257,7 +263,7 @@ class Agent:
         return {}
 
     async def execute(self, command_name, command_args):
-        return await Extensions(agent_config=self.AGENT_CONFIG).execute_command(
+        return await self.extensions.execute_command(
             command_name=command_name, command_args=command_args
         )
 
@@ -267,22 +273,19 @@ class Agent:
         answer = await self.PROVIDER.instruct(prompt=prompt, tokens=tokens)
         return answer
 
-    def get_commands_string(self):
-        if len(self.available_commands) == 0:
-            return None
-
-        enabled_commands = filter(
-            lambda command: command.get("enabled", True), self.available_commands
-        )
-        if not enabled_commands:
-            return None
+    async def instruct_stream(self, prompt, tokens):
+        if not prompt:
+            return
+        if hasattr(self.PROVIDER, "instruct_stream"):
+            async for chunk in self.PROVIDER.instruct_stream(
+                prompt=prompt, tokens=tokens
+            ):
+                yield chunk
+        else:
+            yield await self.PROVIDER.instruct(prompt=prompt, tokens=tokens)
 
-        friendly_names = map(
-            lambda command: f"`{command['friendly_name']}` - Arguments: {command['args']}",
-            enabled_commands,
-        )
-        command_list = "\n".join(friendly_names)
-        return f"Commands Available To Complete Task:\n{command_list}\n\n"
+    def get_commands_string(self):
+        return self.extensions.get_commands_string()
 
     def update_agent_config(self, new_config, config_key):
         agent = (
@@ -378,6 +381,7 @@ class Agent:
                         session.add(agent_setting)
 
             session.commit()
+            invalidate_agent(agent_name=self.agent_name)
             return f"Agent {self.agent_name} configuration updated."
         else:
             return f"Agent {self.agent_name} not found."
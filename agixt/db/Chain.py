@@ -9,16 +9,20 @@ from DBConnection import (
     Prompt,
     Command,
 )
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import aggregate_order_by
 from agixtsdk import AGiXTSDK
 from Extensions import Extensions
 import logging
 import os
+import re
 from dotenv import load_dotenv
 
 load_dotenv()
 ApiClient = AGiXTSDK(
     base_uri="http://localhost:7437", api_key=os.getenv("AGIXT_API_KEY", None)
 )
+STEP_PATTERN = re.compile(r"\{STEP(\d+)\}")
 
 
 class Chain:
@@ -308,69 +312,46 @@ class Chain:
             )
         session.commit()
 
-    def get_step_response(self, chain_name, step_number="all"):
-        chain = session.query(ChainDB).filter(ChainDB.name == chain_name).first()
-
-        if step_number == "all":
-            chain_steps = (
-                session.query(ChainStep)
-                .filter(ChainStep.chain_id == chain.id)
-                .order_by(ChainStep.step_number)
-                .all()
+    def get_step_responses(self, chain_name, step_numbers=None):
+        # One query for the responses of every requested step, oldest response first.
+        query = (
+            session.query(
+                ChainStep.step_number,
+                func.array_agg(
+                    aggregate_order_by(
+                        ChainStepResponse.content, ChainStepResponse.timestamp
+                    )
+                ).filter(ChainStepResponse.id != None),
             )
-
-            responses = {}
-            for step in chain_steps:
-                chain_step_responses = (
-                    session.query(ChainStepResponse)
-                    .filter(ChainStepResponse.chain_step_id == step.id)
-                    .order_by(ChainStepResponse.timestamp)
-                    .all()
-                )
-                step_responses = [response.content for response in chain_step_responses]
-                responses[str(step.step_number)] = step_responses
-
-            return responses
-        else:
-            chain_step = (
-                session.query(ChainStep)
-                .filter(
-                    ChainStep.chain_id == chain.id, ChainStep.step_number == step_number
-                )
-                .first()
+            .join(ChainDB, ChainDB.id == ChainStep.chain_id)
+            .outerjoin(
+                ChainStepResponse, ChainStepResponse.chain_step_id == ChainStep.id
             )
-
-            if chain_step:
-                chain_step_responses = (
-                    session.query(ChainStepResponse)
-                    .filter(ChainStepResponse.chain_step_id == chain_step.id)
-                    .order_by(ChainStepResponse.timestamp)
-                    .all()
-                )
-                step_responses = [response.content for response in chain_step_responses]
-                return step_responses
-            else:
-                return None
-
-    def get_chain_responses(self, chain_name):
-        chain = session.query(ChainDB).filter(ChainDB.name == chain_name).first()
-        chain_steps = (
-            session.query(ChainStep)
-            .filter(ChainStep.chain_id == chain.id)
+            .filter(ChainDB.name == chain_name)
+        )
+        if step_numbers is not None:
+            query = query.filter(ChainStep.step_number.in_(list(step_numbers)))
+        rows = (
+            query.group_by(ChainStep.id, ChainStep.step_number)
             .order_by(ChainStep.step_number)
             .all()
         )
-        responses = {}
-        for step in chain_steps:
-            chain_step_responses = (
-                session.query(ChainStepResponse)
-                .filter(ChainStepResponse.chain_step_id == step.id)
-                .order_by(ChainStepResponse.timestamp)
-                .all()
-            )
-            step_responses = [response.content for response in chain_step_responses]
-            responses[str(step.step_number)] = step_responses
-        return responses
+        return {step_number: responses or [] for step_number, responses in rows}
+
+    def get_step_response(self, chain_name, step_number="all"):
+        if step_number == "all":
+            return self.get_chain_responses(chain_name=chain_name)
+        responses = self.get_step_responses(
+            chain_name=chain_name, step_numbers=[int(step_number)]
+        )
+        return responses.get(int(step_number))
+
+    def get_chain_responses(self, chain_name):
+        responses = self.get_step_responses(chain_name=chain_name)
+        return {
+            str(step_number): step_responses
+            for step_number, step_responses in responses.items()
+        }
 
     def import_chain(self, chain_name: str, steps: dict):
         chain = ChainDB(name=chain_name)
@@ -459,62 +440,40 @@ class Chain:
 
     def get_step_content(self, chain_name, prompt_content, user_input, agent_name):
         if isinstance(prompt_content, dict):
-            new_prompt_content = {}
-            for arg, value in prompt_content.items():
-                if isinstance(value, str):
-                    if "{user_input}" in value:
-                        value = value.replace("{user_input}", user_input)
-                    if "{agent_name}" in value:
-                        value = value.replace("{agent_name}", agent_name)
-                    if "{STEP" in value:
-                        step_count = value.count("{STEP")
-                        for i in range(step_count):
-                            new_step_number = int(value.split("{STEP")[1].split("}")[0])
-                            step_response = self.get_step_response(
-                                chain_name=chain_name, step_number=new_step_number
-                            )
-                            if step_response:
-                                resp = (
-                                    step_response[0]
-                                    if isinstance(step_response, list)
-                                    else step_response
-                                )
-                                value = value.replace(
-                                    f"{{STEP{new_step_number}}}", f"{resp}"
-                                )
-                new_prompt_content[arg] = value
-            return new_prompt_content
+            values = [
+                value for value in prompt_content.values() if isinstance(value, str)
+            ]
         elif isinstance(prompt_content, str):
-            new_prompt_content = prompt_content
-            if "{user_input}" in prompt_content:
-                new_prompt_content = new_prompt_content.replace(
-                    "{user_input}", user_input
-                )
-            if "{agent_name}" in new_prompt_content:
-                new_prompt_content = new_prompt_content.replace(
-                    "{agent_name}", agent_name
-                )
-            if "{STEP" in prompt_content:
-                step_count = prompt_content.count("{STEP")
-                for i in range(step_count):
-                    new_step_number = int(
-                        prompt_content.split("{STEP")[1].split("}")[0]
-                    )
-                    step_response = self.get_step_response(
-                        chain_name=chain_name, step_number=new_step_number
-                    )
-                    if step_response:
-                        resp = (
-                            step_response[0]
-                            if isinstance(step_response, list)
-                            else step_response
-                        )
-                        new_prompt_content = new_prompt_content.replace(
-                            f"{{STEP{new_step_number}}}", f"{resp}"
-                        )
-            return new_prompt_content
+            values = [prompt_content]
         else:
             return prompt_content
+        step_numbers = {
+            int(step_number)
+            for value in values
+            for step_number in STEP_PATTERN.findall(value)
+        }
+        step_responses = (
+            self.get_step_responses(chain_name=chain_name, step_numbers=step_numbers)
+            if step_numbers
+            else {}
+        )
+
+        def replace(value):
+            if "{user_input}" in value:
+                value = value.replace("{user_input}", user_input)
+            if "{agent_name}" in value:
+                value = value.replace("{agent_name}", agent_name)
+            for step_number, responses in step_responses.items():
+                if responses:
+                    value = value.replace(f"{{STEP{step_number}}}", f"{responses[0]}")
+            return value
+
+        if isinstance(prompt_content, str):
+            return replace(prompt_content)
+        return {
+            arg: replace(value) if isinstance(value, str) else value
+            for arg, value in prompt_content.items()
+        }
 
     async def update_chain_responses(self, chain_name, responses):
         for response in responses:
@@ -2,6 +2,7 @@ import os
 import yaml
 import uuid
 from datetime import datetime
+from sqlalchemy import tuple_
 from DBConnection import (
     Conversation,
     Message,
@@ -87,17 +88,71 @@ def get_conversation(agent_name, conversation_name=None, limit=100, page=1):
         return
 
     messages = (
-        session.query(Message).filter(Message.conversation_id == conversation.id).all()
+        session.query(Message)
+        .filter(Message.conversation_id == conversation.id)
+        .order_by(Message.timestamp, Message.id)
+        .offset((int(page) - 1) * int(limit))
+        .limit(int(limit))
+        .all()
     )
-    return_messages = []
-    for message in messages:
-        msg = {
-            "role": message.role,
-            "message": message.content,
-            "timestamp": message.timestamp,
-        }
-        return_messages.append(msg)
-    return return_messages
+    return [message_to_dict(message) for message in messages]
+
+
+def message_to_dict(message):
+    return {
+        "id": str(message.id),
+        "role": message.role,
+        "message": message.content,
+        "timestamp": message.timestamp,
+    }
+
+
+def encode_cursor(message):
+    return f"{message.timestamp.isoformat()}|{message.id}"
+
+
+def decode_cursor(cursor):
+    timestamp, message_id = cursor.split("|", 1)
+    return datetime.fromisoformat(timestamp), uuid.UUID(message_id)
+
+
+def get_conversation_page(agent_name, conversation_name, limit=100, cursor=None):
+    # Keyset pagination, each page seeks the (conversation_id, timestamp, id) index
+    # past the cursor instead of counting through an OFFSET.
+    query = (
+        session.query(Message)
+        .join(Conversation, Message.conversation_id == Conversation.id)
+        .join(Agent, Conversation.agent_id == Agent.id)
+        .filter(Agent.name == agent_name, Conversation.name == conversation_name)
+    )
+    if cursor:
+        timestamp, message_id = decode_cursor(cursor)
+        query = query.filter(
+            tuple_(Message.timestamp, Message.id) > tuple_(timestamp, message_id)
+        )
+    messages = query.order_by(Message.timestamp, Message.id).limit(int(limit) + 1).all()
+    next_cursor = None
+    if len(messages) > int(limit):
+        messages = messages[: int(limit)]
+        next_cursor = encode_cursor(messages[-1])
+    return {
+        "interactions": [message_to_dict(message) for message in messages],
+        "next_cursor": next_cursor,
+    }
+
+
+def get_recent_interactions(agent_name, conversation_name=None, n=5):
+    # Served by the (conversation_id, timestamp) index, only the last n rows are read.
+    messages = (
+        session.query(Message)
+        .join(Conversation, Message.conversation_id == Conversation.id)
+        .join(Agent, Conversation.agent_id == Agent.id)
+        .filter(Agent.name == agent_name, Conversation.name == conversation_name)
+        .order_by(Message.timestamp.desc(), Message.id.desc())
+        .limit(int(n))
+        .all()
+    )
+    return [message_to_dict(message) for message in reversed(messages)]
 
 
 def new_conversation(agent_name, conversation_name):
@@ -152,7 +207,8 @@ def log_interaction(agent_name, conversation_name, role, message):
         session.add(conversation)
         session.commit()
 
-    timestamp = datetime.now().strftime("%B %d, %Y %I:%M %p")
+    # Full precision so messages logged within the same minute keep their order.
+    timestamp = datetime.now()
 
     new_message = Message(
         role=role,
@@ -1,4 +1,5 @@
 from DBConnection import Prompt, PromptCategory, Argument, session
+from PromptTemplates import get_prompt_template, invalidate_prompt_template
 
 
 class Prompts:
@@ -35,6 +36,9 @@ class Prompts:
             )
             session.add(argument)
         session.commit()
+        invalidate_prompt_template(
+            prompt_name=prompt_name, prompt_category=prompt_category.name
+        )
 
     def get_prompt(self, prompt_name, prompt_category="Default"):
         prompt = (
@@ -57,6 +61,16 @@ class Prompts:
             return prompt.content
         return None
 
+    def get_prompt_template(self, prompt_name, prompt_category="Default"):
+        return get_prompt_template(
+            prompt_name=prompt_name,
+            prompt_category=prompt_category,
+            version=None,
+            load=lambda: self.get_prompt(
+                prompt_name=prompt_name, prompt_category=prompt_category
+            ),
+        )
+
     def get_prompts(self, prompt_category="Default"):
         prompts = (
             session.query(Prompt)
@@ -89,6 +103,9 @@ class Prompts:
         if prompt:
             session.delete(prompt)
             session.commit()
+            invalidate_prompt_template(
+                prompt_name=prompt_name, prompt_category=prompt_category
+            )
 
     def update_prompt(self, prompt_name, prompt, prompt_category="Default"):
         prompt_obj = session.query(Prompt).filter_by(name=prompt_name).first()
@@ -133,6 +150,10 @@ class Prompts:
                     session.add(argument)
 
             session.commit()
+            invalidate_prompt_template(
+                prompt_name=prompt_name,
+                prompt_category=prompt_obj.prompt_category.name,
+            )
 
     def rename_prompt(self, prompt_name, new_prompt_name, prompt_category="Default"):
         prompt = (
@@ -145,3 +166,9 @@ class Prompts:
         if prompt:
             prompt.name = new_prompt_name
             session.commit()
+            invalidate_prompt_template(
+                prompt_name=prompt_name, prompt_category=prompt_category
+            )
+            invalidate_prompt_template(
+                prompt_name=new_prompt_name, prompt_category=prompt_category
+            )
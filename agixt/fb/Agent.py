@@ -1,11 +1,10 @@
 import os
 import json
-import glob
 import shutil
-import importlib
-from inspect import signature, Parameter
 from Providers import Providers
 from Extensions import Extensions
+from ExtensionRegistry import get_extension_registry
+from AgentRegistry import invalidate_agent
 
 DEFAULT_SETTINGS = {
     "provider": "gpt4free",
@@ -56,6 +55,7 @@ def add_agent(agent_name, provider_settings=None, commands={}):
     # Write the settings to the agent config file
     with open(config_path, "w") as f:
         f.write(settings)
+    invalidate_agent(agent_name=agent_name)
     return {"message": f"Agent {agent_name} created."}
 
 
@@ -64,6 +64,7 @@ def delete_agent(agent_name):
     try:
         if os.path.exists(folder_path):
             shutil.rmtree(folder_path)
+        invalidate_agent(agent_name=agent_name)
         return {"message": f"Agent {agent_name} deleted."}, 200
     except:
         return {"message": f"Agent {agent_name} could not be deleted."}, 400
@@ -88,6 +89,8 @@ def rename_agent(agent_name, new_name):
             if not new_agent_folder.startswith(base_path):
                 raise ValueError("Invalid path, agent name must not contain slashes.")
         os.rename(folder_path, new_agent_folder)
+        invalidate_agent(agent_name=agent_name)
+        invalidate_agent(agent_name=new_name)
         return {"message": f"Agent {agent_name} renamed to {new_name}."}, 200
 
 
@@ -153,13 +156,12 @@ class Agent:
             else:
                 self.AUTONOMOUS_EXECUTION = True
             self.commands = self.load_commands()
-            self.available_commands = Extensions(
-                agent_config=self.AGENT_CONFIG
-            ).get_available_commands()
+            self.extensions = Extensions(agent_config=self.AGENT_CONFIG)
+            self.available_commands = self.extensions.available_commands
             self.clean_agent_config_commands()
 
     async def execute(self, command_name, command_args):
-        return await Extensions(agent_config=self.AGENT_CONFIG).execute_command(
+        return await self.extensions.execute_command(
             command_name=command_name, command_args=command_args
         )
 
@@ -169,6 +171,17 @@ class Agent:
         answer = await self.PROVIDER.instruct(prompt=prompt, tokens=tokens)
         return answer
 
+    async def instruct_stream(self, prompt, tokens):
+        if not prompt:
+            return
+        if hasattr(self.PROVIDER, "instruct_stream"):
+            async for chunk in self.PROVIDER.instruct_stream(
+                prompt=prompt, tokens=tokens
+            ):
+                yield chunk
+        else:
+            yield await self.PROVIDER.instruct(prompt=prompt, tokens=tokens)
+
     def _load_agent_config_keys(self, keys):
         for key in keys:
             if key in self.AGENT_CONFIG:
@@ -186,21 +199,7 @@ class Agent:
             json.dump(self.AGENT_CONFIG, f)
 
     def get_commands_string(self):
-        if len(self.available_commands) == 0:
-            return None
-
-        enabled_commands = filter(
-            lambda command: command.get("enabled", True), self.available_commands
-        )
-        if not enabled_commands:
-            return None
-
-        friendly_names = map(
-            lambda command: f"`{command['friendly_name']}` - Arguments: {command['args']}",
-            enabled_commands,
-        )
-        command_list = "\n".join(friendly_names)
-        return f"Commands Available To Complete Task:\n{command_list}\n\n"
+        return self.extensions.get_commands_string()
 
     def get_provider(self):
         config_file = self.get_agent_config()
@@ -209,28 +208,11 @@ class Agent:
         else:
             return "openai"
 
-    def get_command_params(self, func):
-        params = {}
-        sig = signature(func)
-        for name, param in sig.parameters.items():
-            if param.default == Parameter.empty:
-                params[name] = None
-            else:
-                params[name] = param.default
-        return params
-
     def load_commands(self):
-        commands = []
-        command_files = glob.glob("extensions/*.py")
-        for command_file in command_files:
-            module_name = os.path.splitext(os.path.basename(command_file))[0]
-            module = importlib.import_module(f"extensions.{module_name}")
-            command_class = getattr(module, module_name.lower())()
-            if hasattr(command_class, "commands"):
-                for command_name, command_function in command_class.commands.items():
-                    params = self.get_command_params(command_function)
-                    commands.append((command_name, command_function.__name__, params))
-        return commands
+        commands = get_extension_registry().get_commands()
+        return [
+            (name, function_name, params) for name, _, function_name, params in commands
+        ]
 
     def get_agent_config(self):
         while True:
@@ -261,6 +243,7 @@ class Agent:
             # Save the updated configuration back to the file
             with open(self.config_path, "w") as f:
                 json.dump(current_config, f)
+            invalidate_agent(agent_name=self.agent_name)
             return f"Agent {self.agent_name} configuration updated."
         else:
             return f"Agent {self.agent_name} configuration not found."
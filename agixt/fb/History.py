@@ -1,86 +1,237 @@
 from datetime import datetime
 import yaml
+import json
+import logging
 import os
 import uuid
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+def lock_file(file, exclusive=True):
+    if fcntl:
+        fcntl.flock(file.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+
+
+def unlock_file(file):
+    if fcntl:
+        fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+
+
+def migrate_conversation(conversation_name):
+    # One time conversion of the old whole-file YAML history to an append-only JSONL log.
+    yaml_file = os.path.join("conversations", f"{conversation_name}.yaml")
+    history_file = os.path.join("conversations", f"{conversation_name}.jsonl")
+    if not os.path.exists(yaml_file):
+        return
+    with open(history_file, "a") as file:
+        lock_file(file)
+        try:
+            if os.path.exists(yaml_file):
+                with open(yaml_file, "r") as old_file:
+                    history = yaml.safe_load(old_file)
+                interactions = (
+                    history["interactions"]
+                    if history and "interactions" in history
+                    else []
+                )
+                file.truncate(0)
+                for interaction in interactions:
+                    file.write(json.dumps(interaction) + "\n")
+                file.flush()
+                os.fsync(file.fileno())
+                os.remove(yaml_file)
+        finally:
+            unlock_file(file)
+
+
+def get_history_file(conversation_name):
+    migrate_conversation(conversation_name=conversation_name)
+    return os.path.join("conversations", f"{conversation_name}.jsonl")
+
+
+def parse_interaction(line):
+    # A line torn by a crash mid-write or otherwise corrupted is skipped, not fatal.
+    if not line.strip():
+        return None
+    try:
+        return json.loads(line)
+    except ValueError:
+        logging.info(f"Skipping unreadable conversation history line: {line[:100]}")
+        return None
+
+
+def read_interactions(history_file):
+    interactions = []
+    with open(history_file, "r") as file:
+        lock_file(file, exclusive=False)
+        try:
+            for line in file:
+                interaction = parse_interaction(line)
+                if interaction is not None:
+                    interactions.append(interaction)
+        finally:
+            unlock_file(file)
+    return interactions
+
+
+def read_last_lines(file, n, block_size=8192):
+    # Reads backwards from the end of the file until n complete lines are found.
+    file.seek(0, os.SEEK_END)
+    position = file.tell()
+    data = b""
+    while position > 0 and data.count(b"\n") <= n:
+        read_size = min(block_size, position)
+        position -= read_size
+        file.seek(position)
+        data = file.read(read_size) + data
+    lines = [line for line in data.split(b"\n") if line.strip()]
+    return lines[-n:] if n > 0 else []
+
+
+def get_recent_interactions(conversation_name=None, n=5, agent_name=None):
+    history_file = get_history_file(conversation_name=conversation_name)
+    if not os.path.exists(history_file):
+        return []
+    with open(history_file, "rb") as file:
+        lock_file(file, exclusive=False)
+        try:
+            lines = read_last_lines(file, int(n))
+        finally:
+            unlock_file(file)
+    interactions = [parse_interaction(line) for line in lines]
+    return [interaction for interaction in interactions if interaction is not None]
+
+
+def get_conversation_page(conversation_name, limit=100, cursor=None, agent_name=None):
+    # The cursor is a byte offset into the append-only log, so a page is one seek.
+    history_file = get_history_file(conversation_name=conversation_name)
+    interactions = []
+    next_cursor = None
+    if not os.path.exists(history_file):
+        return {"interactions": interactions, "next_cursor": next_cursor}
+    with open(history_file, "rb") as file:
+        lock_file(file, exclusive=False)
+        try:
+            file.seek(int(cursor) if cursor else 0)
+            while len(interactions) < int(limit):
+                line = file.readline()
+                if not line:
+                    break
+                interaction = parse_interaction(line)
+                if interaction is not None:
+                    interactions.append(interaction)
+            position = file.tell()
+            if file.readline().strip():
+                next_cursor = str(position)
+        finally:
+            unlock_file(file)
+    return {"interactions": interactions, "next_cursor": next_cursor}
+
 
 def export_conversation(conversation_name=None, agent_name=None):
     if not conversation_name:
         conversation_name = uuid.uuid4()
-    history_file = os.path.join("conversations", f"{conversation_name}.yaml")
+    history_file = get_history_file(conversation_name=conversation_name)
     if os.path.exists(history_file):
-        with open(history_file, "r") as file:
-            history = yaml.safe_load(file)
-        return history
+        return {"interactions": read_interactions(history_file)}
     return {"interactions": []}
 
 
 def get_conversation(conversation_name=None, limit=100, page=1, agent_name=None):
     history = {"interactions": []}
     try:
-        history_file = os.path.join("conversations", f"{conversation_name}.yaml")
+        history_file = get_history_file(conversation_name=conversation_name)
         if os.path.exists(history_file):
-            with open(history_file, "r") as file:
-                history = yaml.safe_load(file)
-    except:
-        new_conversation(conversation_name=conversation_name)
+            start = (int(page) - 1) * int(limit)
+            history = {
+                "interactions": read_interactions(history_file)[
+                    start : start + int(limit)
+                ]
+            }
+    except Exception as e:
+        # Never reset the conversation here, a failed read must not lose its history.
+        logging.info(f"Error reading conversation {conversation_name}: {e}")
     return history
 
 
 def get_conversations(agent_name=None):
     conversation_dir = os.path.join("conversations")
     if os.path.exists(conversation_dir):
-        conversations = os.listdir(conversation_dir)
-        return [conversation.split(".")[0] for conversation in conversations]
+        conversations = []
+        for conversation in os.listdir(conversation_dir):
+            name, extension = os.path.splitext(conversation)
+            if extension in [".jsonl", ".yaml"] and name not in conversations:
+                conversations.append(name)
+        return conversations
     new_conversation(conversation_name=uuid.uuid4())
     return [uuid.uuid4()]
 
 
 def new_conversation(conversation_name, agent_name=None):
     history = {"interactions": []}
-    history_file = os.path.join("conversations", f"{conversation_name}.yaml")
+    history_file = get_history_file(conversation_name=conversation_name)
     os.makedirs(os.path.dirname(history_file), exist_ok=True)
-    with open(history_file, "w") as file:
-        yaml.safe_dump(history, file)
+    with open(history_file, "a") as file:
+        lock_file(file)
+        try:
+            file.truncate(0)
+        finally:
+            unlock_file(file)
     return history
 
 
 def log_interaction(role: str, message: str, conversation_name=None, agent_name=None):
-    history = get_conversation(conversation_name=conversation_name)
-    history_file = os.path.join("conversations", f"{conversation_name}.yaml")
-    if not os.path.exists(history_file):
-        os.makedirs(os.path.dirname(history_file), exist_ok=True)
-    if not history:
-        history = {"interactions": []}
-    if "interactions" not in history:
-        history["interactions"] = []
-    history["interactions"].append(
-        {
-            "role": role,
-            "message": message,
-            "timestamp": datetime.now().strftime("%B %d, %Y %I:%M %p"),
-        }
-    )
-    with open(history_file, "w") as file:
-        yaml.safe_dump(history, file)
+    history_file = get_history_file(conversation_name=conversation_name)
+    os.makedirs(os.path.dirname(history_file), exist_ok=True)
+    interaction = {
+        "role": role,
+        "message": message,
+        "timestamp": datetime.now().strftime("%B %d, %Y %I:%M %p"),
+    }
+    with open(history_file, "ab+") as file:
+        lock_file(file)
+        try:
+            # A torn last line is closed off so it does not swallow this interaction.
+            line = json.dumps(interaction) + "\n"
+            if file.seek(0, os.SEEK_END) > 0:
+                file.seek(-1, os.SEEK_END)
+                if file.read(1) != b"\n":
+                    line = "\n" + line
+            file.write(line.encode())
+            file.flush()
+        finally:
+            unlock_file(file)
 
 
 def delete_history(conversation_name=None, agent_name=None):
-    history_file = os.path.join("conversations", f"{conversation_name}.yaml")
-    if os.path.exists(history_file):
-        os.remove(history_file)
+    for extension in [".jsonl", ".yaml"]:
+        history_file = os.path.join("conversations", f"{conversation_name}{extension}")
+        if os.path.exists(history_file):
+            os.remove(history_file)
 
 
 def delete_message(message, conversation_name=None, agent_name=None):
     if conversation_name:
-        history = get_conversation(
-            agent_name=agent_name, conversation_name=conversation_name
-        )
-        history["interactions"] = [
-            interaction
-            for interaction in history["interactions"]
-            if interaction["message"] != message
-        ]
-        history_file = os.path.join("conversations", f"{conversation_name}.yaml")
-        with open(history_file, "w") as file:
-            yaml.safe_dump(history, file)
+        history_file = get_history_file(conversation_name=conversation_name)
+        if not os.path.exists(history_file):
+            return
+        with open(history_file, "r+") as file:
+            lock_file(file)
+            try:
+                lines = [line for line in file.readlines() if line.strip()]
+                file.seek(0)
+                file.truncate()
+                for line in lines:
+                    interaction = parse_interaction(line)
+                    # Unreadable lines are kept as they are rather than dropped.
+                    if interaction is None:
+                        file.write(line.rstrip("\n") + "\n")
+                    elif interaction.get("message") != message:
+                        file.write(json.dumps(interaction) + "\n")
+                file.flush()
+            finally:
+                unlock_file(file)
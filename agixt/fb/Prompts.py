@@ -1,4 +1,5 @@
 import os
+from PromptTemplates import get_prompt_template, invalidate_prompt_template
 
 
 def get_prompt_file_path(prompt_name, prompt_category="Default"):
@@ -49,6 +50,22 @@ class Prompts:
             prompt = f.read()
         return prompt
 
+    def get_prompt_template(self, prompt_name, prompt_category="Default"):
+        prompt_file = get_prompt_file_path(
+            prompt_name=prompt_name, prompt_category=prompt_category
+        )
+
+        def load():
+            with open(prompt_file, "r") as f:
+                return f.read()
+
+        return get_prompt_template(
+            prompt_name=prompt_name,
+            prompt_category=prompt_category,
+            version=(prompt_file, os.path.getmtime(prompt_file)),
+            load=load,
+        )
+
     def get_prompts(self, prompt_category="Default"):
         # Get all files in prompts folder that end in .txt and replace .txt with empty string
         prompts = []
@@ -91,6 +108,9 @@ class Prompts:
             prompt_name=prompt_name, prompt_category=prompt_category
         )
         os.remove(prompt_file)
+        invalidate_prompt_template(
+            prompt_name=prompt_name, prompt_category=prompt_category
+        )
 
     def update_prompt(self, prompt_name, prompt, prompt_category="Default"):
         prompt_file = get_prompt_file_path(
@@ -98,6 +118,9 @@ class Prompts:
         )
         with open(prompt_file, "w") as f:
             f.write(prompt)
+        invalidate_prompt_template(
+            prompt_name=prompt_name, prompt_category=prompt_category
+        )
 
     def rename_prompt(self, prompt_name, new_prompt_name, prompt_category="Default"):
         prompt_file = get_prompt_file_path(
@@ -107,3 +130,9 @@ class Prompts:
             prompt_name=new_prompt_name, prompt_category=prompt_category
         )
         os.rename(prompt_file, new_prompt_file)
+        invalidate_prompt_template(
+            prompt_name=prompt_name, prompt_category=prompt_category
+        )
+        invalidate_prompt_template(
+            prompt_name=new_prompt_name, prompt_category=prompt_category
+        )
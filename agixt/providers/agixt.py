@@ -1,3 +1,4 @@
+import asyncio
 from agixtsdk import AGiXTSDK
 import os
 from dotenv import load_dotenv
@@ -24,7 +25,8 @@ class AgixtProvider:
     async def instruct(self, prompt, tokens: int = 0):
         for agent in self.agents:
             try:
-                return ApiClient.prompt_agent(
+                return await asyncio.to_thread(
+                    ApiClient.prompt_agent,
                     agent_name=agent,
                     prompt="Custom Input",
                     prompt_args={"user_input": prompt},
@@ -1,4 +1,4 @@
-from time import time
+import asyncio
 from openai.error import RateLimitError
 
 try:
@@ -43,16 +43,16 @@ class AzureProvider:
         messages = [{"role": "system", "content": prompt}]
         for _ in range(num_retries):
             try:
-                resp = openai.ChatCompletion.create(
+                resp = await openai.ChatCompletion.acreate(
                     engine=self.AI_MODEL,
                     messages=messages,
                     max_tokens=int(self.MAX_TOKENS),
                     temperature=float(self.AI_TEMPERATURE),
                     top_p=float(self.AI_TOP_P),
-                )["choices"][0]["message"]["content"]
-                return resp
+                )
+                return resp["choices"][0]["message"]["content"]
 
             except RateLimitError:
                 logging.info("Rate limit exceeded. Retrying after 20 seconds.")
-                time.sleep(20)
+                await asyncio.sleep(20)
                 continue
@@ -1,3 +1,5 @@
+import asyncio
+
 try:
     from Bard import Chatbot
 except ImportError:
@@ -16,8 +18,8 @@ class BardProvider:
 
     async def instruct(self, prompt, tokens: int = 0):
         try:
-            bot = Chatbot(session_id=self.BARD_TOKEN)
-            response = bot.ask(prompt)
+            bot = await asyncio.to_thread(Chatbot, session_id=self.BARD_TOKEN)
+            response = await asyncio.to_thread(bot.ask, prompt)
             return response["content"].replace("\n", "\n")
         except Exception as e:
             return f"Bard Error: {e}"
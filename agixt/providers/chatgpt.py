@@ -1,3 +1,5 @@
+import asyncio
+
 try:
     from revChatGPT.V1 import Chatbot
 except ImportError:
@@ -28,11 +30,14 @@ class ChatgptProvider:
             )
         self.AI_MODEL = AI_MODEL
 
-    async def instruct(self, prompt, tokens: int = 0):
+    def ask(self, prompt):
         response = ""
+        for data in self.bot.ask(prompt=prompt, model=self.AI_MODEL):
+            response = data["message"]
+        return response
+
+    async def instruct(self, prompt, tokens: int = 0):
         try:
-            for data in self.bot.ask(prompt=prompt, model=self.AI_MODEL):
-                response = data["message"]
-            return response
+            return await asyncio.to_thread(self.ask, prompt)
         except Exception as e:
             return f"Chatgpt Error: {e}"
@@ -1,3 +1,5 @@
+import asyncio
+
 try:
     import anthropic
 except ImportError:
@@ -27,7 +29,8 @@ class ClaudeProvider:
         max_new_tokens = int(self.MAX_TOKENS) - int(tokens)
         try:
             c = anthropic.Client(api_key=self.ANTHROPIC_API_KEY)
-            return c.completion(
+            return await asyncio.to_thread(
+                c.completion,
                 prompt=f"{anthropic.HUMAN_PROMPT}{prompt}{anthropic.AI_PROMPT}",
                 stop_sequences=[anthropic.HUMAN_PROMPT],
                 model=self.AI_MODEL,
@@ -1,10 +1,10 @@
-import requests
-import time
+import json
 import logging
+from AsyncProvider import AsyncProvider
 
 
 # Custom OpenAI Style Provider
-class CustomProvider:
+class CustomProvider(AsyncProvider):
     def __init__(
         self,
         API_KEY: str = "",
@@ -17,7 +17,7 @@ class CustomProvider:
         WAIT_AFTER_FAILURE: int = 3,
         **kwargs,
     ):
-        self.requirements = ["requests"]
+        self.requirements = ["httpx"]
         self.AI_MODEL = AI_MODEL if AI_MODEL else "gpt-3.5-turbo-16k-0613"
         self.AI_TEMPERATURE = AI_TEMPERATURE if AI_TEMPERATURE else 0.7
         self.AI_TOP_P = AI_TOP_P if AI_TOP_P else 0.7
@@ -29,13 +29,11 @@ class CustomProvider:
             WAIT_BETWEEN_REQUESTS if WAIT_BETWEEN_REQUESTS else 0
         )
 
-    async def instruct(self, prompt, tokens: int = 0):
-        if int(self.WAIT_BETWEEN_REQUESTS) > 0:
-            time.sleep(int(self.WAIT_BETWEEN_REQUESTS))
+    def get_params(self, prompt, tokens: int = 0, stream: bool = False):
         max_new_tokens = int(self.MAX_TOKENS) - tokens
         if not self.AI_MODEL.startswith("gpt-"):
             # Use completion API
-            params = {
+            return {
                 "prompt": prompt,
                 "model": self.AI_MODEL,
                 "temperature": float(self.AI_TEMPERATURE),
@@ -43,20 +41,22 @@ class CustomProvider:
                 "top_p": float(self.AI_TOP_P),
                 "frequency_penalty": 0,
                 "presence_penalty": 0,
-                "stream": False,
-            }
-        else:
-            # Use chat completion API
-            params = {
-                "messages": [{"role": "user", "content": prompt}],
-                "model": self.AI_MODEL,
-                "temperature": float(self.AI_TEMPERATURE),
-                "max_tokens": max_new_tokens,
-                "top_p": float(self.AI_TOP_P),
-                "stream": False,
+                "stream": stream,
             }
+        # Use chat completion API
+        return {
+            "messages": [{"role": "user", "content": prompt}],
+            "model": self.AI_MODEL,
+            "temperature": float(self.AI_TEMPERATURE),
+            "max_tokens": max_new_tokens,
+            "top_p": float(self.AI_TOP_P),
+            "stream": stream,
+        }
 
-        response = requests.post(
+    async def instruct(self, prompt, tokens: int = 0):
+        await self.sleep(int(self.WAIT_BETWEEN_REQUESTS))
+        params = self.get_params(prompt=prompt, tokens=tokens)
+        response = await self.post(
             self.API_URI,
             headers={"Authorization": f"Bearer {self.API_KEY}"},
             json=params,
@@ -72,6 +72,36 @@ class CustomProvider:
             if "error" in data:
                 logging.info(f"Custom API Error: {data}")
                 if int(self.WAIT_AFTER_FAILURE) > 0:
-                    time.sleep(int(self.WAIT_AFTER_FAILURE))
+                    await self.sleep(int(self.WAIT_AFTER_FAILURE))
                     return await self.instruct(prompt=prompt, tokens=tokens)
             return str(data)
+
+    async def instruct_stream(self, prompt, tokens: int = 0):
+        await self.sleep(int(self.WAIT_BETWEEN_REQUESTS))
+        async with self.stream(
+            "POST",
+            self.API_URI,
+            headers={"Authorization": f"Bearer {self.API_KEY}"},
+            json=self.get_params(prompt=prompt, tokens=tokens, stream=True),
+        ) as response:
+            if response.is_error:
+                await response.aread()
+                logging.info(f"Custom API Error: {response.text}")
+                response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                line = line[5:].strip()
+                if line == "[DONE]":
+                    break
+                try:
+                    choice = json.loads(line)["choices"][0]
+                except:
+                    logging.info(f"Custom API Error: {line}")
+                    continue
+                if "text" in choice:
+                    text = choice["text"]
+                else:
+                    text = choice.get("delta", {}).get("content", "")
+                if text:
+                    yield text
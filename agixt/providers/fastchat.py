@@ -1,8 +1,8 @@
-import requests
 import json
+from AsyncProvider import AsyncProvider
 
 
-class FastchatProvider:
+class FastchatProvider(AsyncProvider):
     def __init__(
         self,
         AI_PROVIDER_URI: str = "",
@@ -18,7 +18,7 @@ class FastchatProvider:
     async def instruct(self, prompt, tokens: int = 0):
         messages = [{"role": "system", "content": prompt}]
         params = {"model": self.MODEL_PATH, "messages": messages}
-        response = requests.post(
+        response = await self.post(
             f"{self.AI_PROVIDER_URI}/v1/chat/completions",
             json={"data": [json.dumps([prompt, params])]},
         )
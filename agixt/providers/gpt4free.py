@@ -1,5 +1,5 @@
+import asyncio
 import logging
-import time
 from g4f import Provider, ChatCompletion
 from g4f.models import ModelUtils
 
@@ -70,7 +70,7 @@ class Gpt4freeProvider:
             if not provider.working:
                 continue
             if int(self.WAIT_BETWEEN_REQUESTS) > 0:
-                time.sleep(int(self.WAIT_BETWEEN_REQUESTS))
+                await asyncio.sleep(int(self.WAIT_BETWEEN_REQUESTS))
             try:
                 logging.info(f"[Gpt4Free] Use provider: {provider.__name__}")
                 if self.AI_MODEL not in provider.model:
@@ -82,7 +82,8 @@ class Gpt4freeProvider:
                     logging.info(f"[Gpt4Free] Use model: {model}")
                 else:
                     model = self.AI_MODEL
-                response = ChatCompletion.create(
+                response = await asyncio.to_thread(
+                    ChatCompletion.create,
                     model=ModelUtils.convert[self.AI_MODEL],
                     provider=provider,
                     messages=[{"role": "user", "content": prompt}],
@@ -95,4 +96,4 @@ class Gpt4freeProvider:
             except Exception as e:
                 logging.error(f"[Gpt4Free] Skip provider: {e}")
                 if int(self.WAIT_AFTER_FAILURE) > 0:
-                    time.sleep(int(self.WAIT_AFTER_FAILURE))
+                    await asyncio.sleep(int(self.WAIT_AFTER_FAILURE))
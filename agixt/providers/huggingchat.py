@@ -46,12 +46,12 @@ class HuggingchatProvider:
             self.session.switch_llm(MODELS.index(self.MODEL_PATH))
 
     async def instruct(self, prompt: str, tokens: int = 0) -> str:
-        for result in self(
+        results = self(
             prompt,
             temperature=self.AI_TEMPERATURE,
             max_new_tokens=min(MODEL_MAX_LENGHT - tokens, self.MAX_TOKENS),
-        ):
-            return result
+        )
+        return await asyncio.to_thread(next, results, None)
 
     async def delete_conversation(self):
         self.session.delete_conversation(self.session.current_conversation)
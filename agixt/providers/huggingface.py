@@ -1,6 +1,5 @@
-import requests
-import time
 import logging
+from AsyncProvider import AsyncProvider
 
 MODELS = {
     "HuggingFaceH4/starchat-beta": 8192,
@@ -16,7 +15,7 @@ MODELS = {
 DEFAULT_MAX_LENGHT = 4096
 
 
-class HuggingfaceProvider:
+class HuggingfaceProvider(AsyncProvider):
     def __init__(
         self,
         MODEL_PATH: str = "HuggingFaceH4/starchat-beta",
@@ -51,7 +50,7 @@ class HuggingfaceProvider:
     def get_max_new_tokens(self, input_length: int = 0) -> int:
         return min(self.get_max_length() - input_length, self.MAX_TOKENS)
 
-    def request(self, inputs, **kwargs):
+    async def request(self, inputs, **kwargs):
         payload = {"inputs": inputs, "parameters": {**kwargs}}
         headers = {}
         if self.HUGGINGFACE_API_KEY:
@@ -62,17 +61,17 @@ class HuggingfaceProvider:
             tries += 1
             if tries > self.max_retries:
                 raise ValueError(f"Reached max retries: {self.max_retries}")
-            response = requests.post(self.get_url(), json=payload, headers=headers)
+            response = await self.post(self.get_url(), json=payload, headers=headers)
             if response.status_code == 429:
                 logging.info(
                     f"Server Error {response.status_code}: Getting rate-limited / wait for {tries} seconds."
                 )
-                time.sleep(tries)
+                await self.sleep(tries)
             elif response.status_code >= 500:
                 logging.info(
                     f"Server Error {response.status_code}: {response.json()['error']} / wait for {tries} seconds"
                 )
-                time.sleep(tries)
+                await self.sleep(tries)
             elif response.status_code != 200:
                 raise ValueError(f"Error {response.status_code}: {response.text}")
             else:
@@ -83,14 +82,15 @@ class HuggingfaceProvider:
             return response.json()
 
     async def instruct(self, prompt, tokens: int = 0):
-        result = self.request(
+        result = await self.request(
             prompt,
             temperature=self.AI_TEMPERATURE,
             max_new_tokens=self.get_max_new_tokens(tokens),
             return_full_text=False,
             stop=self.stop,
             **self.parameters,
-        )[0]["generated_text"]
+        )
+        result = result[0]["generated_text"]
         if self.stop:
             for stop_seq in self.stop:
                 find = result.find(stop_seq)
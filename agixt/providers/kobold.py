@@ -1,7 +1,7 @@
-import requests
+from AsyncProvider import AsyncProvider
 
 
-class KoboldProvider:
+class KoboldProvider(AsyncProvider):
     def __init__(
         self,
         AI_PROVIDER_URI: str = "",
@@ -21,7 +21,7 @@ class KoboldProvider:
             max_tokens = int(self.MAX_TOKENS - tokens)
         except:
             max_tokens = 2000
-        response = requests.post(
+        response = await self.post(
             f"{self.AI_PROVIDER_URI}/api/v1/generate",
             json={
                 "prompt": prompt,
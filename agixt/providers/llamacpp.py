@@ -1,14 +1,70 @@
 import subprocess
 import sys
 import os
+import asyncio
 import logging
 import random
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
 
 try:
     from llama_cpp import Llama
 except:
     subprocess.check_call([sys.executable, "-m", "pip", "install", "llama-cpp-python"])
     from llama_cpp import Llama
+try:
+    from llama_cpp import LlamaRAMCache
+except:
+    LlamaRAMCache = None
+
+load_dotenv()
+# Number of llama.cpp models each worker keeps loaded, the least recently used is dropped.
+LLAMACPP_MAX_MODELS = int(os.getenv("LLAMACPP_MAX_MODELS", "1"))
+
+# Loaded models stay resident while in use, keyed by their load parameters. Only one
+# configuration of each model file is kept, loading another one replaces it.
+models = OrderedDict()
+models_lock = threading.Lock()
+
+
+def get_model(
+    model_path: str,
+    n_ctx: int,
+    n_threads: int = None,
+    n_gpu_layers: int = 0,
+    n_batch: int = 2048,
+    prompt_cache_mb: int = 0,
+):
+    key = (model_path, n_ctx, n_threads, n_gpu_layers, n_batch)
+    with models_lock:
+        if key in models:
+            models.move_to_end(key)
+        else:
+            # Dropped entries are freed once the generations still holding them finish.
+            for old_key in [k for k in models if k[0] == model_path]:
+                logging.info(f"Unloading llama.cpp model {model_path} {old_key[1:]}.")
+                del models[old_key]
+            while models and len(models) >= max(1, LLAMACPP_MAX_MODELS):
+                old_key, _ = models.popitem(last=False)
+                logging.info(f"Unloading llama.cpp model {old_key[0]}.")
+            logging.info(f"Loading llama.cpp model {model_path} with n_ctx={n_ctx}.")
+            model = Llama(
+                model_path=model_path,
+                n_gpu_layers=n_gpu_layers,
+                n_threads=n_threads,
+                n_batch=n_batch,
+                n_ctx=n_ctx,
+                use_mmap=True,
+                seed=random.randint(1, 1000000000),
+                verbose=False,
+            )
+            if LlamaRAMCache is not None and prompt_cache_mb > 0:
+                model.set_cache(
+                    LlamaRAMCache(capacity_bytes=prompt_cache_mb * 1024 * 1024)
+                )
+            models[key] = {"model": model, "lock": asyncio.Lock()}
+        return models[key]
 
 
 class LlamacppProvider:
@@ -22,6 +78,7 @@ class LlamacppProvider:
         BATCH_SIZE: int = 2048,
         THREADS: int = 0,
         STOP_SEQUENCE: str = "</s>",
+        PROMPT_CACHE_MB: int = 1024,
         **kwargs,
     ):
         self.requirements = ["llama-cpp-python"]
@@ -32,6 +89,7 @@ class LlamacppProvider:
         self.BATCH_SIZE = BATCH_SIZE if BATCH_SIZE else 2048
         self.THREADS = THREADS if THREADS != 0 else None
         self.STOP_SEQUENCE = STOP_SEQUENCE if STOP_SEQUENCE else "</s>"
+        self.PROMPT_CACHE_MB = PROMPT_CACHE_MB if PROMPT_CACHE_MB else 0
         self.MODEL_PATH = MODEL_PATH
         if self.MODEL_PATH:
             try:
@@ -39,30 +97,33 @@ class LlamacppProvider:
             except:
                 self.MAX_TOKENS = 2048
 
-    async def instruct(self, prompt, tokens: int = 0):
-        if os.path.isfile(self.MODEL_PATH):
-            self.model = Llama(
-                model_path=self.MODEL_PATH,
-                n_gpu_layers=int(self.GPU_LAYERS),
-                n_threads=int(self.THREADS),
-                n_batch=int(self.BATCH_SIZE),
-                n_ctx=int(self.MAX_TOKENS),
-                seed=random.randint(1, 1000000000),
-            )
-        else:
-            logging.info("Unable to find model path.")
-            return None
-        response = self.model(
+    def generate(self, model, prompt, tokens: int = 0):
+        response = model(
             prompt,
+            max_tokens=int(self.MAX_TOKENS) - tokens,
             stop=[self.STOP_SEQUENCE],
             temperature=float(self.AI_TEMPERATURE),
-            echo=True,
+            echo=False,
+        )
+        return response["choices"][0]["text"].lstrip("\n")
+
+    async def instruct(self, prompt, tokens: int = 0):
+        if not os.path.isfile(self.MODEL_PATH):
+            logging.info("Unable to find model path.")
+            return None
+        entry = await asyncio.to_thread(
+            get_model,
+            model_path=self.MODEL_PATH,
+            n_ctx=int(self.MAX_TOKENS),
+            n_threads=int(self.THREADS) if self.THREADS else None,
+            n_gpu_layers=int(self.GPU_LAYERS),
+            n_batch=int(self.BATCH_SIZE),
+            prompt_cache_mb=int(self.PROMPT_CACHE_MB),
         )
-        data = response["choices"][0]["text"]
-        data = data.replace(prompt, "")
-        data = data.lstrip("\n")
-        try:
-            self.model.reset()
-        except:
-            print("Unable to reset model.")
-        return data
+        # One generation per model at a time, the context is not shared between calls.
+        # Requests wait on the lock before taking a worker thread, and the evaluated
+        # prompt is kept so a shared prefix is not evaluated again next turn.
+        async with entry["lock"]:
+            return await asyncio.to_thread(
+                self.generate, entry["model"], prompt, tokens
+            )
@@ -1,8 +1,8 @@
-import requests
 import random
+from AsyncProvider import AsyncProvider
 
 
-class LlamacppapiProvider:
+class LlamacppapiProvider(AsyncProvider):
     def __init__(
         self,
         AI_PROVIDER_URI: str = "http://localhost:8000",
@@ -28,7 +28,9 @@ class LlamacppapiProvider:
             "stop": self.STOP_SEQUENCE,
             "seed": random.randint(1, 1000000000),
         }
-        response = requests.post(f"{self.AI_PROVIDER_URI}/v1/completions", json=params)
+        response = await self.post(
+            f"{self.AI_PROVIDER_URI}/v1/completions", json=params
+        )
         data = response.json()
         print(data)
         choices = data["choices"]
@@ -1,14 +1,14 @@
-import requests
 import re
 import os
 from dotenv import load_dotenv
+from AsyncProvider import AsyncProvider
 
 load_dotenv()
 
 TEXTGEN_URI = os.getenv("TEXTGEN_URI", "http://localhost:5000")
 
 
-class OobaboogaProvider:
+class OobaboogaProvider(AsyncProvider):
     def __init__(
         self,
         AI_PROVIDER_URI: str = "",
@@ -111,7 +111,9 @@ class OobaboogaProvider:
             "custom_stopping_strings": "",  # leave this blank
             "stopping_strings": [self.STOP_STRING],
         }
-        response = requests.post(f"{self.AI_PROVIDER_URI}/api/v1/generate", json=params)
+        response = await self.post(
+            f"{self.AI_PROVIDER_URI}/api/v1/generate", json=params
+        )
         data = None
 
         if response.status_code == 200:
@@ -1,4 +1,4 @@
-import time
+import asyncio
 import logging
 
 try:
@@ -43,15 +43,24 @@ class OpenaiProvider:
         openai.api_key = OPENAI_API_KEY
 
     async def instruct(self, prompt, tokens: int = 0):
-        if self.OPENAI_API_KEY == "" or self.OPENAI_API_KEY is "YOUR_OPENAI_API_KEY":
+        if self.OPENAI_API_KEY == "" or self.OPENAI_API_KEY == "YOUR_OPENAI_API_KEY":
             return "Please go to the Agent Management page to set your OpenAI API key."
         max_new_tokens = int(self.MAX_TOKENS) - tokens
-        if int(self.WAIT_BETWEEN_REQUESTS) > 0:
-            time.sleep(int(self.WAIT_BETWEEN_REQUESTS))
+        response = None
         try:
+            if self.stream:
+                answer = [
+                    chunk
+                    async for chunk in self.instruct_stream(
+                        prompt=prompt, tokens=tokens
+                    )
+                ]
+                return "".join(answer).strip()
+            if int(self.WAIT_BETWEEN_REQUESTS) > 0:
+                await asyncio.sleep(int(self.WAIT_BETWEEN_REQUESTS))
             if not self.AI_MODEL.startswith("gpt-"):
                 # Use completion API
-                response = openai.Completion.create(
+                response = await openai.Completion.acreate(
                     engine=self.AI_MODEL,
                     prompt=prompt,
                     temperature=float(self.AI_TEMPERATURE),
@@ -59,23 +68,12 @@ class OpenaiProvider:
                     top_p=float(self.AI_TOP_P),
                     frequency_penalty=0,
                     presence_penalty=0,
-                    stream=bool(self.stream),
                 )
-                if not self.stream:
-                    return response.choices[0].text.strip()
-                else:
-                    answer = []
-                    for event in response:
-                        event_text = event["choices"][0]["text"]
-                        if event_text:
-                            answer.append(event_text.get("text", ""))
-                        time.sleep(0.1)
-                    new_response = " ".join(answer)
-                    return new_response.strip()
+                return response.choices[0].text.strip()
             else:
                 # Use chat completion API
                 messages = [{"role": "system", "content": prompt}]
-                response = openai.ChatCompletion.create(
+                response = await openai.ChatCompletion.acreate(
                     model=self.AI_MODEL,
                     messages=messages,
                     temperature=float(self.AI_TEMPERATURE),
@@ -83,22 +81,49 @@ class OpenaiProvider:
                     top_p=float(self.AI_TOP_P),
                     n=1,
                     stop=None,
-                    stream=bool(self.stream),
                 )
-                if not self.stream:
-                    return response.choices[0].message.content.strip()
-                else:
-                    answer = []
-                    for event in response:
-                        event_text = event["choices"][0]["delta"]
-                        if event_text:
-                            answer.append(event_text.get("content", ""))
-                        time.sleep(0.1)
-                    new_response = " ".join(answer)
-                    return new_response.strip()
+                return response.choices[0].message.content.strip()
         except Exception as e:
             logging.info(f"OpenAI API Error: {e}")
             if int(self.WAIT_AFTER_FAILURE) > 0:
-                time.sleep(int(self.WAIT_AFTER_FAILURE))
+                await asyncio.sleep(int(self.WAIT_AFTER_FAILURE))
                 return await self.instruct(prompt=prompt, tokens=tokens)
             return str(response)
+
+    async def instruct_stream(self, prompt, tokens: int = 0):
+        if self.OPENAI_API_KEY == "" or self.OPENAI_API_KEY == "YOUR_OPENAI_API_KEY":
+            yield "Please go to the Agent Management page to set your OpenAI API key."
+            return
+        max_new_tokens = int(self.MAX_TOKENS) - tokens
+        if int(self.WAIT_BETWEEN_REQUESTS) > 0:
+            await asyncio.sleep(int(self.WAIT_BETWEEN_REQUESTS))
+        if not self.AI_MODEL.startswith("gpt-"):
+            response = await openai.Completion.acreate(
+                engine=self.AI_MODEL,
+                prompt=prompt,
+                temperature=float(self.AI_TEMPERATURE),
+                max_tokens=max_new_tokens,
+                top_p=float(self.AI_TOP_P),
+                frequency_penalty=0,
+                presence_penalty=0,
+                stream=True,
+            )
+            async for event in response:
+                text = event["choices"][0].get("text", "")
+                if text:
+                    yield text
+        else:
+            response = await openai.ChatCompletion.acreate(
+                model=self.AI_MODEL,
+                messages=[{"role": "system", "content": prompt}],
+                temperature=float(self.AI_TEMPERATURE),
+                max_tokens=max_new_tokens,
+                top_p=float(self.AI_TOP_P),
+                n=1,
+                stop=None,
+                stream=True,
+            )
+            async for event in response:
+                text = event["choices"][0]["delta"].get("content", "")
+                if text:
+                    yield text
@@ -1,3 +1,5 @@
+import asyncio
+
 try:
     import google.generativeai as palm
 except ImportError:
@@ -28,7 +30,8 @@ class PalmProvider:
 
     async def instruct(self, prompt, tokens: int = 0):
         new_max_tokens = int(self.MAX_TOKENS) - tokens
-        completion = palm.generate_text(
+        completion = await asyncio.to_thread(
+            palm.generate_text,
             model="models/text-bison-001",
             prompt=prompt,
             temperature=float(self.AI_TEMPERATURE),
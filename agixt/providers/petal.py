@@ -1,3 +1,4 @@
+import asyncio
 from providers.pipeline import PipelineProvider
 from transformers import AutoTokenizer
 
@@ -52,8 +53,9 @@ class PetalProvider(PipelineProvider):
         self.requirements = ["petals", "transformers[accelerate]", "torch"]
 
     async def instruct(self, prompt, tokens: int = 0):
-        self.load_pipeline()
-        return self.pipeline(
+        await asyncio.to_thread(self.load_pipeline)
+        return await asyncio.to_thread(
+            self.pipeline,
             prompt,
             temperature=self.AI_TEMPERATURE,
             max_new_tokens=self.get_max_new_tokens(tokens),
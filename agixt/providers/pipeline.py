@@ -6,6 +6,8 @@ except ImportError:
     subprocess.check_call([sys.executable, "-m", "pip", "install", "transformers"])
     from transformers import pipeline
 
+from PipelineServer import get_pipeline_server
+
 has_accelerate = True
 try:
     import torch
@@ -26,6 +28,34 @@ def is_cuda_available():
     return has_accelerate
 
 
+def get_max_length(generator):
+    if generator.model.generation_config.max_length:
+        return generator.model.generation_config.max_length
+    max_length = generator.tokenizer.model_max_length
+    if max_length == int(1e30):
+        return 4096
+    return max_length
+
+
+def run_batch(generator, prompts, params):
+    # Prompts are left padded to the longest one, so it decides the room left to generate.
+    input_length = max(
+        len(generator.tokenizer(prompt)["input_ids"]) for prompt in prompts
+    )
+    max_new_tokens = params["max_new_tokens"]
+    max_length = get_max_length(generator) - input_length
+    if max_length > 0 and max_new_tokens > max_length:
+        max_new_tokens = max_length
+    outputs = generator(
+        prompts,
+        batch_size=len(prompts),
+        temperature=params["temperature"],
+        return_full_text=False,
+        max_new_tokens=max_new_tokens,
+    )
+    return [output[0]["generated_text"] for output in outputs]
+
+
 class PipelineProvider:
     def __init__(
         self,
@@ -47,13 +77,14 @@ class PipelineProvider:
             self.pipeline_kwargs["use_auth_token"] = HUGGINGFACE_API_KEY
 
     async def instruct(self, prompt, tokens: int = 0):
-        self.load_pipeline()
-        return self.pipeline(
+        server = get_pipeline_server(
+            name=self.MODEL_PATH, load=self.create_pipeline, run=run_batch
+        )
+        return await server.submit(
             prompt,
-            temperature=self.AI_TEMPERATURE,
-            return_full_text=False,
-            max_new_tokens=self.get_max_new_tokens(tokens),
-        )[0]["generated_text"]
+            temperature=float(self.AI_TEMPERATURE),
+            max_new_tokens=int(self.MAX_TOKENS),
+        )
 
     def load_args(self):
         if is_cuda_available():
@@ -72,21 +103,21 @@ class PipelineProvider:
                 if has_bitsandbytes:
                     self.pipeline_kwargs["load_in_8bit"] = True
 
+    def create_pipeline(self):
+        self.load_args()
+        generator = pipeline("text-generation", self.MODEL_PATH, **self.pipeline_kwargs)
+        if generator.tokenizer.pad_token_id is None:
+            generator.tokenizer.pad_token_id = generator.model.config.eos_token_id
+        generator.tokenizer.padding_side = "left"
+        return generator
+
     def load_pipeline(self):
         if not self.pipeline:
-            self.load_args()
-            self.pipeline = pipeline(
-                "text-generation", self.MODEL_PATH, **self.pipeline_kwargs
-            )
+            self.pipeline = self.create_pipeline()
 
     def get_max_length(self):
         self.load_pipeline()
-        if self.pipeline.model.generation_config.max_length:
-            return self.pipeline.model.generation_config.max_length
-        max_length = self.pipeline.tokenizer.model_max_length
-        if max_length == int(1e30):
-            return 4096
-        return max_length
+        return get_max_length(self.pipeline)
 
     def get_max_new_tokens(self, input_length: int = 0) -> int:
         max_length = self.get_max_length() - input_length
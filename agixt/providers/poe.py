@@ -1,3 +1,5 @@
+import asyncio
+
 try:
     import poe
 except ImportError:
@@ -34,17 +36,19 @@ class PoeProvider:
         self.POE_TOKEN = POE_TOKEN
         self.AI_MODEL = AI_MODEL.lower()
 
+    def send_message(self, prompt):
+        client = poe.Client(token=self.POE_TOKEN)
+        if self.AI_MODEL not in client.bot_names:
+            try:
+                self.AI_MODEL = client.get_bot_by_codename(self.AI_MODEL)
+            except:
+                raise Exception(f"Invalid AI Model: {self.AI_MODEL}")
+        for chunk in client.send_message(chatbot=self.AI_MODEL, message=prompt):
+            pass
+        return chunk["text"].replace("\n", "\n")
+
     async def instruct(self, prompt, tokens: int = 0):
         try:
-            client = poe.Client(token=self.POE_TOKEN)
-            if self.AI_MODEL not in client.bot_names:
-                try:
-                    self.AI_MODEL = client.get_bot_by_codename(self.AI_MODEL)
-                except:
-                    raise Exception(f"Invalid AI Model: {self.AI_MODEL}")
-            for chunk in client.send_message(chatbot=self.AI_MODEL, message=prompt):
-                pass
-            response = chunk["text"].replace("\n", "\n")
-            return response
+            return await asyncio.to_thread(self.send_message, prompt)
         except Exception as e:
             return f"Poe Error: {e}"
@@ -1,31 +1,9 @@
-from threading import Thread
-from concurrent.futures import Future
 import logging
-import time
 import random
+from AsyncProvider import AsyncProvider
 
 
-def call_with_future(fn, future, args, kwargs):
-    try:
-        result = fn(*args, **kwargs)
-        future.set_result(result)
-    except Exception as exc:
-        future.set_exception(exc)
-
-
-def threaded(fn):
-    def wrapper(*args, **kwargs):
-        future = Future()
-        Thread(target=call_with_future, args=(fn, future, args, kwargs)).start()
-        return future
-
-    return wrapper
-
-
-import requests
-
-
-class RunpodProvider:
+class RunpodProvider(AsyncProvider):
     def __init__(
         self,
         AI_PROVIDER_URI: str = "",
@@ -44,14 +22,13 @@ class RunpodProvider:
         self.AI_MODEL = AI_MODEL if AI_MODEL else "default"
         self.API_KEY = API_KEY
 
-    @threaded
     async def instruct(self, prompt, tokens: int = 0):
         headers = {"Authorization": f"Bearer {self.API_KEY}"}
         max_new_tokens = int(self.MAX_TOKENS) - tokens
 
         logging.info("Instructing Agent with %s", prompt)
 
-        run_response = requests.post(
+        run_response = await self.post(
             f"{self.AI_PROVIDER_URI}/run",
             headers=headers,
             json={
@@ -87,7 +64,7 @@ class RunpodProvider:
         while True:
             status_url = f"{self.AI_PROVIDER_URI}/status/{jobId}"
             logging.info("Requesting status url: %s", status_url)
-            status_response = requests.get(status_url, headers=headers)
+            status_response = await self.get(status_url, headers=headers)
             logging.info("Status Response: %s", status_response.json())
             status = status_response.json()["status"]
             logging.info("Status: %s", status)
@@ -107,4 +84,4 @@ class RunpodProvider:
                 return None
             else:
                 logging.info("Sleeping for 2")
-                time.sleep(2)
+                await self.sleep(2)
@@ -0,0 +1,95 @@
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "agixt")
+)
+from sqlalchemy import text
+from DBConnection import Agent, Conversation, Message, session
+from db.History import (
+    encode_cursor,
+    get_conversation,
+    get_conversation_page,
+    get_recent_interactions,
+)
+
+# Latency of tail, first page and last page reads as one conversation grows to 100k
+# messages on the Postgres backend. The test data is removed afterwards.
+#   DB_CONNECTED=true python tests/history_benchmark.py
+
+
+def measure(function, runs=20):
+    start = time.perf_counter()
+    for _ in range(runs):
+        function()
+    return (time.perf_counter() - start) * 1000 / runs
+
+
+if __name__ == "__main__":
+    agent = Agent(name=f"History Benchmark {uuid.uuid4()}")
+    session.add(agent)
+    session.commit()
+    conversation = Conversation(agent_id=agent.id, name="Benchmark")
+    session.add(conversation)
+    session.commit()
+    first_timestamp = datetime(2024, 1, 1)
+    total = 0
+    try:
+        for size in [1000, 10000, 100000]:
+            session.bulk_insert_mappings(
+                Message,
+                [
+                    {
+                        "id": uuid.uuid4(),
+                        "role": "USER" if i % 2 == 0 else agent.name,
+                        "content": f"Benchmark message {i}",
+                        "timestamp": first_timestamp + timedelta(seconds=i),
+                        "conversation_id": conversation.id,
+                    }
+                    for i in range(total, size)
+                ],
+            )
+            session.commit()
+            total = size
+            session.execute(text("ANALYZE message"))
+            last_page_start = (
+                session.query(Message)
+                .filter(Message.conversation_id == conversation.id)
+                .order_by(Message.timestamp, Message.id)
+                .offset(size - 101)
+                .first()
+            )
+            recent = measure(
+                lambda: get_recent_interactions(agent.name, "Benchmark", n=5)
+            )
+            first_page = measure(
+                lambda: get_conversation_page(agent.name, "Benchmark", limit=100)
+            )
+            last_page = measure(
+                lambda: get_conversation_page(
+                    agent.name,
+                    "Benchmark",
+                    limit=100,
+                    cursor=encode_cursor(last_page_start),
+                )
+            )
+            offset_page = measure(
+                lambda: get_conversation(
+                    agent.name, "Benchmark", limit=100, page=size // 100
+                )
+            )
+            print(
+                f"{size} messages: last 5 {recent:.2f}ms, first page {first_page:.2f}ms, "
+                f"last page by cursor {last_page:.2f}ms, last page by offset {offset_page:.2f}ms"
+            )
+    finally:
+        session.rollback()
+        session.query(Message).filter(
+            Message.conversation_id == conversation.id
+        ).delete()
+        session.query(Conversation).filter(Conversation.id == conversation.id).delete()
+        session.query(Agent).filter(Agent.id == agent.id).delete()
+        session.commit()
@@ -0,0 +1,72 @@
+import sys
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from agixtsdk import AGiXTSDK
+
+# Load test for the Postgres backend. Start AGiXT with DB_CONNECTED=true and a given
+# POSTGRES_POOL_SIZE, run this script, then restart with another pool size and compare.
+#   cd agixt && DB_CONNECTED=true POSTGRES_POOL_SIZE=1 POSTGRES_MAX_OVERFLOW=0 python app.py
+#   python tests/pool_benchmark.py --agent gpt4free --requests 100 --concurrency 1 4 16
+
+
+def prompt(ApiClient, agent_name, prompt_name, user_input):
+    start = time.perf_counter()
+    try:
+        ApiClient.prompt_agent(
+            agent_name=agent_name,
+            prompt_name=prompt_name,
+            prompt_args={
+                "user_input": user_input,
+                "websearch": False,
+                "websearch_depth": 0,
+                "context_results": 0,
+                "shots": 1,
+                "disable_memory": True,
+            },
+        )
+        return time.perf_counter() - start, True
+    except Exception as e:
+        print(f"Request failed: {e}", file=sys.stderr)
+        return time.perf_counter() - start, False
+
+
+def run(ApiClient, agent_name, prompt_name, user_input, requests, concurrency):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(
+            executor.map(
+                lambda _: prompt(ApiClient, agent_name, prompt_name, user_input),
+                range(requests),
+            )
+        )
+    elapsed = time.perf_counter() - start
+    latencies = sorted(latency for latency, ok in results if ok)
+    failures = len([ok for _, ok in results if not ok])
+    p50 = latencies[len(latencies) // 2] if latencies else 0
+    p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0
+    print(
+        f"concurrency {concurrency}: {len(latencies) / elapsed:.2f} req/s, "
+        f"p50 {p50:.2f}s, p95 {p95:.2f}s, {failures} failed"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base-uri", default="http://localhost:7437")
+    parser.add_argument("--agent", default="gpt4free")
+    parser.add_argument("--prompt", default="Chat")
+    parser.add_argument("--user-input", default="Say hello.")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 32])
+    args = parser.parse_args()
+    ApiClient = AGiXTSDK(base_uri=args.base_uri)
+    for concurrency in args.concurrency:
+        run(
+            ApiClient,
+            agent_name=args.agent,
+            prompt_name=args.prompt,
+            user_input=args.user_input,
+            requests=args.requests,
+            concurrency=concurrency,
+        )
@@ -0,0 +1,69 @@
+import os
+import sys
+import glob
+import timeit
+
+AGIXT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "agixt")
+sys.path.insert(0, AGIXT_PATH)
+from PromptTemplates import PLACEHOLDER_PATTERN, PromptTemplate
+
+# Compares rendering every prompt in agixt/prompts through the compiled templates with
+# the regex substitution they replaced, and checks both give the same output.
+#   python tests/prompt_template_benchmark.py
+
+
+def regex_format(string, **kwargs):
+    def replace(match):
+        value = kwargs.get(match.group(1), match.group(0))
+        if isinstance(value, list):
+            return "".join(str(x) for x in value)
+        return str(value)
+
+    return PLACEHOLDER_PATTERN.sub(replace, string)
+
+
+if __name__ == "__main__":
+    templates = {}
+    for prompt_file in glob.glob(os.path.join(AGIXT_PATH, "prompts", "*", "*.txt")):
+        with open(prompt_file, "r") as f:
+            templates[prompt_file] = f.read()
+    if not templates:
+        templates["sample"] = (
+            "You are {agent_name}. Today is {date}.\n{context}\n{COMMANDS}\n"
+            "Recent conversation:\n{conversation_history}\n"
+            "Working directory: {working_directory}\nUser: {user_input}\n"
+        ) * 4
+    arguments = {
+        "agent_name": "AGiXT",
+        "date": "January 01, 2024 12:00 PM",
+        "context": "The user's input causes you remember these things:\nA fact.\n",
+        "COMMANDS": "Commands Available To Complete Task:\n`Read File`\n\n",
+        "command_list": "Commands Available To Complete Task:\n`Read File`\n\n",
+        "conversation_history": "2024-01-01 USER: Hello\n",
+        "working_directory": "./WORKSPACE",
+        "helper_agent_name": "AGiXT",
+        "user_input": "What is the weather like today?",
+    }
+    number = 2000
+    regex_total = 0.0
+    compiled_total = 0.0
+    for name, text in templates.items():
+        template = PromptTemplate(text)
+        assert template.render(**arguments) == regex_format(text, **arguments)
+        regex_time = timeit.timeit(
+            lambda: regex_format(text, **arguments), number=number
+        )
+        compiled_time = timeit.timeit(
+            lambda: template.render(**arguments), number=number
+        )
+        regex_total += regex_time
+        compiled_total += compiled_time
+        print(
+            f"{name}: regex {regex_time / number * 1e6:.1f}us, "
+            f"compiled {compiled_time / number * 1e6:.1f}us"
+        )
+    print(
+        f"{len(templates)} templates: regex {regex_total / number * 1e6:.1f}us, "
+        f"compiled {compiled_total / number * 1e6:.1f}us per render of all templates "
+        f"({regex_total / compiled_total:.1f}x faster)"
+    )
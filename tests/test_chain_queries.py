@@ -0,0 +1,111 @@
+import os
+import sys
+import uuid
+from datetime import datetime
+import pytest
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "agixt")
+)
+
+# Query count checks for the Postgres backend: reading chain responses and deleting an
+# agent must not grow with the number of chain steps.
+#   DB_CONNECTED=true python -m pytest tests/test_chain_queries.py
+if os.getenv("DB_CONNECTED", "false").lower() != "true":
+    pytest.skip("Requires DB_CONNECTED=true.", allow_module_level=True)
+
+from DBConnection import (
+    session,
+    QueryCounter,
+    Agent,
+    Chain as ChainDB,
+    ChainStep,
+    ChainStepResponse,
+)
+from db.Agent import delete_agent
+from db.Chain import Chain
+
+
+@pytest.fixture
+def query_counter():
+    def count_queries(function):
+        with QueryCounter() as counter:
+            function()
+        return counter.count
+
+    return count_queries
+
+
+def create_chain(step_count: int):
+    agent = Agent(name=f"Chain Test {uuid.uuid4()}")
+    chain = ChainDB(name=f"Chain Test {uuid.uuid4()}")
+    session.add_all([agent, chain])
+    session.commit()
+    for step_number in range(1, step_count + 1):
+        step = ChainStep(
+            chain_id=chain.id,
+            agent_id=agent.id,
+            step_number=step_number,
+            prompt_type="Prompt",
+            prompt="Think About It",
+        )
+        session.add(step)
+        session.flush()
+        session.add_all(
+            [
+                ChainStepResponse(
+                    chain_step_id=step.id,
+                    content=f"Step {step_number} {i}",
+                    timestamp=datetime(2024, 1, 1, 0, 0, i),
+                )
+                for i in range(3)
+            ]
+        )
+    session.commit()
+    return agent, chain
+
+
+def get_query_counts(query_counter, step_count: int):
+    agent, chain = create_chain(step_count=step_count)
+    chain_functions = Chain()
+    prompt = " ".join(f"{{STEP{i}}}" for i in range(1, step_count + 1))
+    try:
+        responses = chain_functions.get_chain_responses(chain_name=chain.name)
+        assert len(responses) == step_count
+        assert responses["1"] == ["Step 1 0", "Step 1 1", "Step 1 2"]
+        assert chain_functions.get_step_response(chain.name, 2) == responses["2"]
+        assert "{STEP" not in chain_functions.get_step_content(
+            chain.name, prompt, "", agent.name
+        )
+        return {
+            "get_step_response": query_counter(
+                lambda: chain_functions.get_step_response(chain_name=chain.name)
+            ),
+            "get_chain_responses": query_counter(
+                lambda: chain_functions.get_chain_responses(chain_name=chain.name)
+            ),
+            "get_step_content": query_counter(
+                lambda: chain_functions.get_step_content(
+                    chain.name, {"user_input": prompt}, "", agent.name
+                )
+            ),
+            "delete_agent": query_counter(lambda: delete_agent(agent.name)),
+        }
+    finally:
+        session.rollback()
+        session.query(ChainDB).filter(ChainDB.id == chain.id).delete()
+        session.query(Agent).filter(Agent.id == agent.id).delete()
+        session.commit()
+
+
+def test_chain_responses_are_read_in_one_query(query_counter):
+    counts = get_query_counts(query_counter, step_count=5)
+    assert counts["get_step_response"] == 1, counts
+    assert counts["get_chain_responses"] == 1, counts
+    assert counts["get_step_content"] == 1, counts
+
+
+def test_query_counts_do_not_grow_with_steps(query_counter):
+    assert get_query_counts(query_counter, step_count=5) == get_query_counts(
+        query_counter, step_count=50
+    )